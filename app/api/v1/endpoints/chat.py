@@ -1,6 +1,13 @@
-from fastapi import APIRouter, HTTPException, UploadFile, Depends, File
+from fastapi import APIRouter, HTTPException, UploadFile, Depends, File, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from langchain_community.document_loaders import PyPDFLoader
-from app.services.vector_store import VectorStore
+from app.services.vector_store import VectorStore, StaleCursorError
+from app.services.single_flight import SingleFlight
+from app.services.llm_scheduler import LLMScheduler, SchedulerOverloaded, SchedulerDeadlineExceeded
+from app.services.extractive import ExtractiveAnswerer
+from app.services.intent_router import IntentRouter
+from app.services.hwp_loader import HWPLoader, HWPFormatError, HWPDependencyError
 from app.prompts.port_authority_prompt import PORT_AUTHORITY_PROMPT
 from app.core.config import settings
 from langchain.chains.retrieval import create_retrieval_chain
@@ -14,9 +21,13 @@ from app.db import models, database
 from urllib.parse import unquote
 from langdetect import detect
 from deep_translator import GoogleTranslator
+import asyncio
+import json
 import tempfile
 import logging
-from typing import List, Dict, Any
+import re
+import unicodedata
+from typing import List, Dict, Any, Optional
 import os
 
 from langchain_core.output_parsers import StrOutputParser
@@ -34,28 +45,83 @@ class ChatRequest(BaseModel):
 translator_ko = GoogleTranslator(source='auto', target='ko')
 translator_en = GoogleTranslator(source='auto', target='en')
 
+answer_flight = SingleFlight()
+translation_flight = SingleFlight()
+
+llm_scheduler = LLMScheduler(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    max_queue_size=settings.LLM_MAX_QUEUE_SIZE,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_retries=settings.LLM_MAX_RETRIES,
+)
+
+extractive_answerer = ExtractiveAnswerer()
+
+intent_router = IntentRouter(
+    vector_store.embedding_model,
+    threshold=settings.FAQ_MATCH_THRESHOLD,
+    refresh_interval=settings.FAQ_REFRESH_INTERVAL,
+)
+
+hwp_loader = HWPLoader()
+
+# 대용량 HWP 업로드를 임시 파일로 옮길 때의 읽기 단위와, 벡터 저장소에 한 번에 넣는 청크 수
+UPLOAD_READ_SIZE = 1024 * 1024
+HWP_BATCH_SIZE = 256
+
+# 프롬프트 토큰 수 추정치 (한국어는 대략 2자당 1토큰) + 응답 토큰 여유분
+COMPLETION_TOKEN_BUDGET = 512
+
+# 스케줄러 우선순위 단위. 추정 토큰이 적은 요청을 먼저 보내고, 같은 구간 안에서는 들어온 순서를 지킨다.
+# 긴 요청이 계속 밀려도 큐 마감이 지나면 추출형 답변으로 대체되므로 무한히 기다리지 않는다.
+PRIORITY_TOKEN_STEP = 1000
+
+def estimate_tokens(*texts):
+    return sum(len(text) for text in texts) // 2 + COMPLETION_TOKEN_BUDGET
+
+def answer_priority(tokens):
+    return tokens // PRIORITY_TOKEN_STEP
+
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip(" ?!.。？！")
+
+async def load_pdf(file: UploadFile):
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+            temp_path = temp_file.name
+            temp_file.write(await file.read())
+
+        # PDF 문서 로드 및 분리
+        pdf_loader = PyPDFLoader(temp_path)
+        documents = pdf_loader.load_and_split()
+
+        # 임시 파일 경로 대신 업로드된 파일 이름을 출처로 사용해 문서별로 추적한다.
+        for doc in documents:
+            doc.metadata["source"] = file.filename
+        return documents
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
 @router.post("/upload-pdf")
-async def upload_pdf(files: List[UploadFile] = File(...)):
+async def upload_pdf(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
     logger.info(f"Received {len(files)} files")
     documents = []
 
     for file in files:
-        temp_path = None
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_path = temp_file.name
-                temp_file.write(await file.read())
-
             if file.filename is None or not file.filename.lower().endswith('.pdf'):
                 logger.warning(f"Invalid file type: {file.filename}")
                 continue
 
-            # PDF 문서 로드 및 분리
-            pdf_loader = PyPDFLoader(temp_path)
-            new_documents = pdf_loader.load_and_split()
+            new_documents = await load_pdf(file)
             
             if not new_documents:
                 logger.error(f"No documents were extracted from {file.filename}.")
@@ -65,113 +131,340 @@ async def upload_pdf(files: List[UploadFile] = File(...)):
             is_law = 'law' in file.filename.lower()
             
             # 벡터 저장소에 문서 추가
-            vector_store.add_documents(new_documents, is_law_related=is_law)
+            await run_in_threadpool(vector_store.add_documents, new_documents, is_law_related=is_law)
             
             logger.info(f"Processed {len(new_documents)} documents from {file.filename}. Is law related: {is_law}")
             documents.extend(new_documents)
         
         except Exception as e:
             logger.error(f"Error processing file {file.filename}: {str(e)}", exc_info=True)
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
 
     if not documents:
         raise HTTPException(status_code=500, detail="No valid documents were extracted from any of the files.")
 
     # 기존 문서 정제 및 중복 제거
-    vector_store.clean_existing_documents()
+    await run_in_threadpool(vector_store.clean_existing_documents)
+    # 스냅샷 모드에서는 업로드마다 세그먼트가 하나씩 늘어나므로 필요하면 백그라운드에서 합친다.
+    background_tasks.add_task(vector_store.compact_if_needed)
 
     return {"message": f"{len(files)} files uploaded and processed successfully"}
 
+async def save_upload(file: UploadFile, suffix):
+    # 업로드 본문을 한 번에 메모리에 올리지 않고 1MiB씩 임시 파일로 옮긴다.
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        while True:
+            chunk = await file.read(UPLOAD_READ_SIZE)
+            if not chunk:
+                break
+            temp_file.write(chunk)
+        return temp_file.name
+
+def hwp_batches(path, source):
+    # 청크를 생성되는 대로 HWP_BATCH_SIZE개씩 묶어 문서 전체를 메모리에 올리지 않는다.
+    batch = []
+    for doc in hwp_loader.lazy_load(path, source=source):
+        batch.append(doc)
+        if len(batch) >= HWP_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_hwp(path, source, is_law, replace_source=None):
+    # 추출한 청크 수와 저장소에 새로 들어간 청크 수를 돌려준다. 파일이 손상되어 있으면 저장소는 바뀌지 않는다.
+    if not vector_store.snapshot_mode:
+        # 인메모리 저장소는 배치마다 바로 반영되므로, 먼저 파일 전체를 한 번 파싱해 손상 여부를 확인한다.
+        for _ in hwp_loader.lazy_load(path, source=source):
+            pass
+
+    extracted = 0
+    def counted_batches():
+        nonlocal extracted
+        for batch in hwp_batches(path, source):
+            extracted += len(batch)
+            yield batch
+
+    added = vector_store.add_document_batches(counted_batches(), is_law_related=is_law, replace_source=replace_source)
+    return extracted, added
+
+async def ingest_hwp_upload(file: UploadFile, source, is_law, replace_source=None):
+    temp_path = None
+    try:
+        temp_path = await save_upload(file, os.path.splitext(source)[1])
+        return await run_in_threadpool(ingest_hwp, temp_path, source, is_law, replace_source)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@router.post("/upload-hwp")
+async def upload_hwp(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    if file.filename is None or not file.filename.lower().endswith(('.hwp', '.hwpx')):
+        raise HTTPException(status_code=400, detail=f"Invalid file type: {file.filename}")
+
+    is_law = hwp_loader.is_law_related_file(file.filename)
+    try:
+        _, added = await ingest_hwp_upload(file, file.filename, is_law)
+    except HWPFormatError as e:
+        logger.warning(f"Rejected HWP file {file.filename}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except HWPDependencyError as e:
+        # 구형 HWP(OLE) 파일은 olefile이 설치된 경우에만 읽을 수 있다.
+        logger.error(f"Cannot read HWP file {file.filename}: {str(e)}")
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing file {file.filename}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    logger.info(f"Processed {added} documents from {file.filename}. Is law related: {is_law}")
+    await run_in_threadpool(vector_store.clean_existing_documents)
+    background_tasks.add_task(vector_store.compact_if_needed)
+    return {"message": f"{file.filename} uploaded and processed successfully", "documents": added}
+
+@router.put("/documents/{source:path}")
+async def replace_document(source: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    # 같은 출처의 이전 리비전 청크를 tombstone 처리하고 새 파일의 청크로 교체한다.
+    if not source.lower().endswith(('.pdf', '.hwp', '.hwpx')):
+        raise HTTPException(status_code=400, detail="Only PDF and HWP/HWPX sources can be replaced.")
+    try:
+        is_law = 'law' in source.lower()
+        if source.lower().endswith('.pdf'):
+            file.filename = source
+            documents = await load_pdf(file)
+            if not documents:
+                raise HTTPException(status_code=400, detail=f"No documents were extracted from {source}.")
+            added = await run_in_threadpool(vector_store.add_documents, documents, is_law_related=is_law, replace_source=source)
+        else:
+            extracted, added = await ingest_hwp_upload(file, source, is_law, replace_source=source)
+            if not extracted:
+                raise HTTPException(status_code=400, detail=f"No documents were extracted from {source}.")
+    except HTTPException as e:
+        raise e
+    except HWPFormatError as e:
+        logger.warning(f"Rejected HWP file {source}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except HWPDependencyError as e:
+        logger.error(f"Cannot read HWP file {source}: {str(e)}")
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error replacing source {source}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    background_tasks.add_task(vector_store.compact_if_needed)
+    return {"message": f"{source} replaced", "documents": added}
+
+@router.delete("/documents/{source:path}")
+async def delete_document(source: str, background_tasks: BackgroundTasks):
+    try:
+        removed = await run_in_threadpool(vector_store.delete_source, source)
+    except Exception as e:
+        logger.error(f"Error deleting source {source}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"No documents found for source {source}")
+
+    background_tasks.add_task(vector_store.compact_if_needed)
+    return {"message": f"{source} deleted", "documents": removed}
+
+async def generate_answer(translated_text):
+    # 질문이 법률 관련인지 확인
+    law_keywords = ["법", "규율", "조항", "규정", "법적", "항만공사법", "조례"]
+    is_law_related = any(keyword in translated_text for keyword in law_keywords)
+
+    # 질문 임베딩은 한 번만 계산해 FAQ 매칭과 검색에 함께 사용한다.
+    query_vector = await run_in_threadpool(vector_store.embed_query, translated_text)
+
+    # 빠른 응답 버튼과 같은 의도의 질문이면 검색과 LLM 호출 없이 저장된 답변을 반환
+    intent = await run_in_threadpool(intent_router.match, query_vector)
+    if intent is not None:
+        return {
+            "answer": intent["response_text"],
+            "link": intent["link"],
+            "is_law_related": is_law_related,
+            "degraded": False,
+            "matched_intent": intent["button_name"]
+        }
+
+    # 큐가 가득 찼으면 검색 전에 바로 거절한다.
+    llm_scheduler.check_capacity()
+
+    # 벡터 저장소 선택 및 검색
+    docs = []
+    if is_law_related:
+        docs = await run_in_threadpool(vector_store.search, translated_text, is_law_related=True, k=4, query_vector=query_vector)
+
+    # 법률 관련 문서가 충분하지 않으면 일반 벡터 저장소에서도 검색
+    if len(docs) < 2:
+        general_docs = await run_in_threadpool(vector_store.search, translated_text, is_law_related=False, k=4, query_vector=query_vector)
+        docs.extend(general_docs)
+
+    if not docs:
+        return {"answer": "죄송합니다. 관련된 정보를 찾을 수 없습니다.", "is_law_related": is_law_related, "degraded": False}
+
+    # OPENAI API 키를 가져옴
+    api_key = settings.OPENAI_API_KEY.get_secret_value() if settings.OPENAI_API_KEY else None
+    if api_key is None:
+        raise HTTPException(status_code=500, detail="OpenAI API key is not set.")
+
+    # RAG 체인 설정 및 실행
+    context = format_docs(docs)
+    rag_chain = (
+        {"context": RunnablePassthrough() | (lambda x: context), "question": RunnablePassthrough()}
+        | PORT_AUTHORITY_PROMPT
+        | ChatOpenAI(model="gpt-3.5-turbo", temperature=0.5, api_key=SecretStr(api_key), max_retries=0)
+        | StrOutputParser()
+    )
+
+    # 429 재시도는 스케줄러가 담당한다. 큐 대기 마감은 답변 마감 시간을 넘지 않도록 제한한다.
+    tokens = estimate_tokens(PORT_AUTHORITY_PROMPT.template, context, translated_text)
+    try:
+        response = await asyncio.wait_for(
+            llm_scheduler.submit(
+                lambda: rag_chain.ainvoke(translated_text),
+                tokens=tokens,
+                priority=answer_priority(tokens),
+                timeout=min(settings.LLM_QUEUE_TIMEOUT, settings.LLM_ANSWER_DEADLINE),
+            ),
+            timeout=settings.LLM_ANSWER_DEADLINE,
+        )
+    except SchedulerDeadlineExceeded:
+        logger.warning("Falling back to extractive answer: LLM request missed its queue deadline")
+        response = None
+    except asyncio.TimeoutError:
+        logger.warning("Falling back to extractive answer: deadline exceeded")
+        response = None
+    except SchedulerOverloaded:
+        # 큐가 가득 찼거나 공급자 한도를 넘긴 경우는 503 + Retry-After로 응답한다.
+        raise
+    except Exception as e:
+        logger.warning(f"Falling back to extractive answer: {str(e)}", exc_info=True)
+        response = None
+
+    if response is None:
+        # 마감 시간 초과나 LLM 오류 시 이미 검색된 문서로 추출형 답변을 만든다.
+        fallback = extractive_answerer.answer(translated_text, docs)
+        return {
+            "answer": fallback["answer"],
+            "is_law_related": is_law_related,
+            "degraded": True,
+            "sources": fallback["sources"]
+        }
+
+    # 응답 포맷팅
+    formatted_response = "\n\n".join(paragraph.strip() for paragraph in response.split('\n') if paragraph.strip())
+
+    return {
+        "answer": formatted_response,
+        "is_law_related": is_law_related,
+        "degraded": False
+    }
+
+async def translate(text, target):
+    # 같은 문장의 번역 요청도 하나로 합친다.
+    translator = translator_ko if target == 'ko' else translator_en
+    key = (target, normalize_question(text))
+    return await translation_flight.do(key, lambda: run_in_threadpool(translator.translate, text))
+
 @router.post("/chat")
 async def chat(request: ChatRequest):
     try:
         # 메시지 언어 감지 및 한국어 번역
         input_language = detect(request.message)
-        translated_text = translator_ko.translate(request.message) if input_language != 'ko' else request.message
-
-        # 질문이 법률 관련인지 확인
-        law_keywords = ["법", "규율", "조항", "규정", "법적", "항만공사법", "조례"]
-        is_law_related = any(keyword in translated_text for keyword in law_keywords)
-
-        # 벡터 저장소 선택 및 검색
-        docs = []
-        if is_law_related and vector_store.law_vector_store:
-            law_retriever = vector_store.law_vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 4})
-            docs = law_retriever.get_relevant_documents(translated_text)
-
-        # 법률 관련 문서가 충분하지 않으면 일반 벡터 저장소에서도 검색
-        if len(docs) < 2 and vector_store.general_vector_store:
-            general_retriever = vector_store.general_vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 4})
-            general_docs = general_retriever.get_relevant_documents(translated_text)
-            docs.extend(general_docs)
-
-        if not docs:
-            return {"answer": "죄송합니다. 관련된 정보를 찾을 수 없습니다.", "is_law_related": is_law_related}
-
-        # OPENAI API 키를 가져옴
-        api_key = settings.OPENAI_API_KEY.get_secret_value() if settings.OPENAI_API_KEY else None
-        if api_key is None:
-            raise HTTPException(status_code=500, detail="OpenAI API key is not set.")
-
-        # RAG 체인 설정 및 실행
-        rag_chain = (
-            {"context": RunnablePassthrough() | (lambda x: format_docs(docs)), "question": RunnablePassthrough()}
-            | PORT_AUTHORITY_PROMPT
-            | ChatOpenAI(model="gpt-3.5-turbo", temperature=0.5, api_key=SecretStr(api_key))
-            | StrOutputParser()
-        )
+        translated_text = await translate(request.message, 'ko') if input_language != 'ko' else request.message
 
-        response = rag_chain.invoke(translated_text)
-
-        # 응답 포맷팅
-        formatted_response = "\n\n".join(paragraph.strip() for paragraph in response.split('\n') if paragraph.strip())
+        # 번역된 질문과 인덱스 버전이 같은 동시 요청은 검색과 LLM 호출을 한 번만 수행한다.
+        # 스냅샷 모드에서는 버전을 읽다가 새 스냅샷을 열 수 있으므로 이벤트 루프 밖에서 읽는다.
+        index_version = await run_in_threadpool(lambda: vector_store.index_version)
+        key = (normalize_question(translated_text), index_version)
+        result = await answer_flight.do(key, lambda: generate_answer(translated_text))
 
         # 응답을 원래 언어로 번역
-        translated_response = translator_en.translate(formatted_response) if input_language != 'ko' else formatted_response
+        translated_response = await translate(result["answer"], 'en') if input_language != 'ko' else result["answer"]
 
-        return {
-            "answer": translated_response,
-            "is_law_related": is_law_related
-        }
+        return {**result, "answer": translated_response}
 
     except HTTPException as e:
         raise e
+    except SchedulerOverloaded as e:
+        logger.warning(f"Chat request rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="The service is busy. Please try again later.", headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="An error occurred while processing your request.")
     
-@router.get("/check-vector-store")
-async def check_vector_store(is_law_related: bool = False):
+@router.get("/llm-scheduler/metrics")
+async def llm_scheduler_metrics():
+    return llm_scheduler.metrics()
+
+def resolve_partition(partition, is_law_related):
+    if partition is None:
+        return is_law_related
+    if partition not in ("general", "law"):
+        raise HTTPException(status_code=400, detail="partition must be 'general' or 'law'")
+    return partition == "law"
+
+def serialize_document(row, doc):
+    return {"id": row, "content": doc.page_content, "metadata": doc.metadata}
+
+def parse_cursor(cursor):
+    # 커서는 "{세대}:{행 번호}" 형식이다.
     try:
-        target_vector_store = vector_store.law_vector_store if is_law_related else vector_store.general_vector_store
-        target_documents = vector_store.law_documents if is_law_related else vector_store.general_documents
+        generation, row = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor must be a next_cursor value returned by this endpoint")
+    if generation < 0 or row < 0:
+        raise HTTPException(status_code=400, detail="cursor must be a next_cursor value returned by this endpoint")
+    return generation, row
 
-        if target_vector_store is None:
-            return {"message": f"{'Law' if is_law_related else 'General'} vector store is empty"}
+@router.get("/check-vector-store")
+async def check_vector_store(
+    is_law_related: bool = False,
+    partition: Optional[str] = None,
+    source: Optional[str] = None,
+    page: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    law = resolve_partition(partition, is_law_related)
+    generation, start = parse_cursor(cursor) if cursor else (None, 0)
+    try:
+        generation, rows, next_row = await run_in_threadpool(vector_store.list_documents, law, start=start, limit=limit, source=source, page=page, generation=generation)
+        return {
+            "partition": "law" if law else "general",
+            "documents": [serialize_document(row, doc) for row, doc in rows],
+            "next_cursor": f"{generation}:{next_row}" if next_row is not None else None
+        }
+    except StaleCursorError as e:
+        # 압축으로 행 번호가 바뀌었으므로 처음부터 다시 조회해야 한다.
+        raise HTTPException(status_code=409, detail=f"{str(e)}. Restart from the first page.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        seen_contents = set()
-        content = []
+@router.get("/check-vector-store/export")
+async def export_vector_store(partition: Optional[str] = None, source: Optional[str] = None, page: Optional[int] = None):
+    # 파티션을 지정하지 않으면 general, law 순서로 모두 내보낸다.
+    partitions = [resolve_partition(partition, False)] if partition is not None else [False, True]
 
-        for doc in target_documents:
-            if doc.page_content not in seen_contents:
-                seen_contents.add(doc.page_content)
-                content.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata
-                })
+    def generate():
+        for law in partitions:
+            for row, doc in vector_store.iter_documents(law, source=source, page=page):
+                line = {"partition": "law" if law else "general", **serialize_document(row, doc)}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
 
-        if not content:
-            return {"message": "No documents found in the vector store"}
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
-        return {
-            "message": f"{'Law' if is_law_related else 'General'} vector store contains documents",
-            "vector_store_content": content
-        }
+@router.get("/check-vector-store/stats")
+async def vector_store_stats():
+    try:
+        return await run_in_threadpool(vector_store.stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.on_event("startup")
+def startup_event():
+    # 빠른 응답 의도 표의 첫 임베딩을 백그라운드에서 미리 시작한다.
+    intent_router.ensure_loaded()
+
 @router.on_event("shutdown")
 def shutdown_event():
     vector_store.save_local("faiss_index")
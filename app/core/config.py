@@ -18,6 +18,26 @@ class Settings(BaseSettings):
     ELASTICSEARCH_HOST: Optional[str] = os.getenv("ELASTICSEARCH_HOST")
     ELASTICSEARCH_PORT: Optional[str] = os.getenv("ELASTICSEARCH_PORT")
     RDB_URL: Optional[str] = os.getenv("RDB_URL")
+    # 멀티 프로세스 서빙: 설정 시 워커들이 이 디렉터리의 인덱스 스냅샷을 공유한다.
+    INDEX_SNAPSHOT_DIR: Optional[str] = os.getenv("INDEX_SNAPSHOT_DIR")
+    INDEX_REFRESH_INTERVAL: float = float(os.getenv("INDEX_REFRESH_INTERVAL", "2.0"))
+    # 스냅샷 1차 검색 방식: none(float32) | int8 | binary, 상위 k * RESCORE_FACTOR개 후보를 float32로 재채점
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    RESCORE_FACTOR: int = int(os.getenv("RESCORE_FACTOR", "4"))
+    # LLM 호출 스케줄러 (공급자 요금제 한도에 맞춰 설정)
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "90000"))
+    LLM_MAX_QUEUE_SIZE: int = int(os.getenv("LLM_MAX_QUEUE_SIZE", "100"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    # 이 시간 안에 LLM 응답이 없으면 검색 결과에서 추출한 답변으로 대체한다. LLM_QUEUE_TIMEOUT은 이 값을 넘지 않도록 제한된다.
+    LLM_ANSWER_DEADLINE: float = float(os.getenv("LLM_ANSWER_DEADLINE", "8"))
+    # 자주 묻는 질문 빠른 경로: 버튼 의도와의 코사인 유사도가 이 값 이상이면 저장된 답변을 반환한다.
+    FAQ_MATCH_THRESHOLD: float = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.9"))
+    FAQ_REFRESH_INTERVAL: float = float(os.getenv("FAQ_REFRESH_INTERVAL", "300"))
+    # 삭제(tombstone)된 청크 비율이 이 값을 넘으면 백그라운드에서 인덱스를 압축한다.
+    COMPACTION_TOMBSTONE_RATIO: float = float(os.getenv("COMPACTION_TOMBSTONE_RATIO", "0.2"))
     class Config:
         env_file = ".env"
 
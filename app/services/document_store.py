@@ -0,0 +1,162 @@
+from array import array
+from langchain.schema import Document
+
+HASH_SIZE = 16
+NO_PAGE = -1
+
+
+def page_of(metadata):
+    # PyPDFLoader는 0부터 시작하는 "page", PDFLoader는 1부터 시작하는 "page_number"를 쓴다.
+    if metadata.get("page") is not None:
+        return int(metadata["page"])
+    if metadata.get("page_number") is not None:
+        return int(metadata["page_number"]) - 1
+    return NO_PAGE
+
+
+class DocumentStore:
+    # 청크를 Document 객체 대신 열 단위로 보관한다.
+    # 본문은 하나의 UTF-8 버퍼와 오프셋 배열에, 출처는 인턴된 목록의 인덱스로, 해시는 16바이트씩 이어 붙여 저장한다.
+    # 삭제된 청크는 바로 지우지 않고 tombstone으로 표시했다가 compact()에서 정리한다.
+    def __init__(self, is_law_related=False):
+        self.is_law_related = is_law_related
+        # 행 번호 체계의 세대. compact()로 행 번호가 바뀔 때마다 1씩 올라간다.
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        self._texts = bytearray()
+        self._offsets = array('q', [0])
+        self._pages = array('i')
+        self._source_ids = array('i')
+        self._hashes = bytearray()
+        self._revisions = array('i')
+        self._alive = bytearray()
+        self.sources = []
+        self._source_index = {}
+        self._source_rows = {}
+        self.source_revisions = {}
+        self.tombstones = 0
+        # 살아 있는 청크의 UTF-8 본문 크기. 추가와 tombstone 때 갱신한다.
+        self.live_bytes = 0
+
+    def __len__(self):
+        return len(self._pages)
+
+    @property
+    def live_count(self):
+        return len(self._pages) - self.tombstones
+
+    @property
+    def tombstone_ratio(self):
+        return self.tombstones / len(self._pages) if len(self._pages) else 0.0
+
+    def memory_usage(self):
+        return (
+            len(self._texts)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._pages.itemsize * len(self._pages)
+            + self._source_ids.itemsize * len(self._source_ids)
+            + len(self._hashes)
+            + self._revisions.itemsize * len(self._revisions)
+            + len(self._alive)
+        )
+
+    def source_id(self, source):
+        return self._source_index.get(source)
+
+    def _intern_source(self, source):
+        source = str(source) if source is not None else ""
+        source_id = self._source_index.get(source)
+        if source_id is None:
+            source_id = len(self.sources)
+            self._source_index[source] = source_id
+            self.sources.append(source)
+            self._source_rows[source_id] = array('q')
+            self.source_revisions[source_id] = 0
+        return source_id
+
+    def append(self, text, source, page, digest, revision=None):
+        source_id = self._intern_source(source)
+        if revision is None:
+            revision = self.source_revisions[source_id]
+        self.source_revisions[source_id] = max(self.source_revisions[source_id], revision)
+
+        row = len(self._pages)
+        encoded = text.encode("utf-8")
+        self._texts += encoded
+        self.live_bytes += len(encoded)
+        self._offsets.append(len(self._texts))
+        self._pages.append(page)
+        self._source_ids.append(source_id)
+        self._hashes += digest
+        self._revisions.append(revision)
+        self._alive.append(1)
+        self._source_rows[source_id].append(row)
+        return row
+
+    def append_document(self, doc, digest, revision=None):
+        return self.append(doc.page_content, doc.metadata.get("source"), page_of(doc.metadata), digest, revision)
+
+    def tombstone_source(self, source):
+        # 해당 출처의 청크만 순회하므로 전체 문서 수와 무관하게 O(해당 출처 청크 수)이다.
+        source_id = self._source_index.get(source)
+        if source_id is None:
+            return []
+        removed = []
+        for row in self._source_rows[source_id]:
+            if self._alive[row]:
+                self._alive[row] = 0
+                self.live_bytes -= self._offsets[row + 1] - self._offsets[row]
+                removed.append(self.hash(row))
+        self.tombstones += len(removed)
+        self._source_rows[source_id] = array('q')
+        # 삭제도 새 리비전으로 기록해, 이후 다시 올린 문서가 이전 리비전과 구분되도록 한다.
+        self.source_revisions[source_id] += 1
+        return removed
+
+    def compact(self):
+        # 살아 있는 청크만 새 열로 다시 쓴다. 행 번호가 바뀌므로 새 저장소를 돌려준다.
+        compacted = DocumentStore(self.is_law_related)
+        compacted.generation = self.generation + 1
+        for row in range(len(self)):
+            if self._alive[row]:
+                compacted.append(self.text(row), self.source(row), self._pages[row], self.hash(row), self._revisions[row])
+        for source, source_id in self._source_index.items():
+            if self.source_revisions[source_id]:
+                compacted.source_revisions[compacted._intern_source(source)] = self.source_revisions[source_id]
+        return compacted
+
+    def text(self, row):
+        return self._texts[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def source(self, row):
+        return self.sources[self._source_ids[row]]
+
+    def hash(self, row):
+        return bytes(self._hashes[row * HASH_SIZE:(row + 1) * HASH_SIZE])
+
+    def is_alive(self, row):
+        return bool(self._alive[row])
+
+    def hashes(self):
+        return (self.hash(row) for row in range(len(self)) if self._alive[row])
+
+    def matches(self, row, source_id=None, page=None):
+        if not self._alive[row]:
+            return False
+        if source_id is not None and self._source_ids[row] != source_id:
+            return False
+        if page is not None and self._pages[row] != page:
+            return False
+        return True
+
+    def metadata(self, row):
+        metadata = {"source": self.source(row), "revision": self._revisions[row], "is_law_related": self.is_law_related}
+        if self._pages[row] != NO_PAGE:
+            metadata["page"] = self._pages[row]
+        return metadata
+
+    def document(self, row):
+        # Document 객체는 API 경계에서만 만든다.
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
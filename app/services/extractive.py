@@ -0,0 +1,68 @@
+import re
+import math
+
+
+class ExtractiveAnswerer:
+    # LLM 응답이 늦거나 실패할 때, 검색된 청크에서 질문과 가장 겹치는 문장을 골라 답변을 만든다.
+    def __init__(self, max_sentences=3, min_sentence_length=10):
+        self.max_sentences = max_sentences
+        self.min_sentence_length = min_sentence_length
+
+    def split_sentences(self, text):
+        sentences = re.split(r'(?<=[.!?。])\s+|\n+', text)
+        return [s.strip() for s in sentences if len(s.strip()) >= self.min_sentence_length]
+
+    def compact(self, text):
+        return "".join(text.lower().split())
+
+    def bigrams(self, text):
+        # 한국어는 조사가 붙어 단어 단위 비교가 어려우므로 공백을 제외한 글자 bigram을 사용한다.
+        text = self.compact(text)
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def page_number(self, metadata):
+        if metadata.get("page_number") is not None:
+            return metadata["page_number"]
+        if metadata.get("page") is not None:
+            return int(metadata["page"]) + 1
+        return None
+
+    def answer(self, query, docs):
+        query_bigrams = self.bigrams(query)
+        candidates = []
+        seen = set()
+
+        for rank, doc in enumerate(docs):
+            # 검색 순위가 높은 청크의 문장에 약간의 가중치를 준다.
+            rank_weight = 1.0 / (1.0 + 0.2 * rank)
+            for position, sentence in enumerate(self.split_sentences(doc.page_content)):
+                if sentence in seen:
+                    continue
+                seen.add(sentence)
+                # 문장마다 bigram 집합을 만드는 대신 질문의 bigram이 문장에 들어 있는지만 확인한다.
+                compact = self.compact(sentence)
+                overlap = sum(1 for bigram in query_bigrams if bigram in compact)
+                if not overlap:
+                    continue
+                score = overlap / math.sqrt(max(1, len(compact) - 1)) * rank_weight
+                candidates.append((score, rank, position, sentence, doc.metadata))
+
+        if not candidates:
+            # 겹치는 문장이 없으면 최상위 청크의 첫 문장들을 보여준다.
+            top = docs[0]
+            candidates = [(0.0, 0, i, s, top.metadata) for i, s in enumerate(self.split_sentences(top.page_content))]
+
+        selected = sorted(candidates, key=lambda c: -c[0])[:self.max_sentences]
+        # 읽기 자연스럽도록 원문 순서대로 다시 정렬한다.
+        selected.sort(key=lambda c: (c[1], c[2]))
+
+        lines = []
+        sources = []
+        for _, _, _, sentence, metadata in selected:
+            source = {"source": metadata.get("source"), "page": self.page_number(metadata)}
+            if source not in sources:
+                sources.append(source)
+            page = f" p.{source['page']}" if source["page"] is not None else ""
+            lines.append(f"{sentence} (출처: {source['source']}{page})")
+
+        return {"answer": "\n\n".join(lines), "sources": sources}
@@ -0,0 +1,246 @@
+import io
+import os
+import re
+import sys
+import zlib
+import struct
+import logging
+import zipfile
+from array import array
+import xml.etree.ElementTree as ET
+from langchain.schema import Document
+
+try:
+    import olefile
+except ImportError:  # 구형 HWP(OLE) 파일을 읽을 때만 필요하다.
+    olefile = None
+
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_SIGNATURE = b"PK\x03\x04"
+
+# HWP 5.0 레코드 태그
+HWPTAG_BEGIN = 0x10
+HWPTAG_PARA_TEXT = HWPTAG_BEGIN + 51
+
+# 한 글자(2바이트)만 차지하는 제어 문자. 나머지 제어 문자(1~31)는 8글자(16바이트)를 차지한다.
+CHAR_CONTROLS = {0, 10, 13, 24, 25, 26, 27, 28, 29, 30, 31}
+CONTROL_REPLACEMENTS = {9: " ", 10: " ", 24: "-", 30: " ", 31: " "}
+
+READ_SIZE = 64 * 1024
+# 레코드 하나의 최대 크기. 손상되었거나 악의적인 파일이 선언한 거대한 레코드를 버퍼에 쌓지 않도록 거절한다.
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+# 손상된 파일을 읽을 때 파서가 던지는 예외
+FORMAT_ERRORS = (zipfile.BadZipFile, ET.ParseError, zlib.error, struct.error, EOFError, UnicodeDecodeError)
+
+
+class HWPFormatError(ValueError):
+    pass
+
+
+class HWPDependencyError(RuntimeError):
+    pass
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+class HWPLoader:
+    # HWPX(zip + XML)와 구형 HWP(OLE 복합 문서)를 스트리밍으로 읽어 PDF와 같은 형태의 청크로 만든다.
+    # HWP에는 조판 전 페이지 정보가 없으므로 구역(section) 번호를 "page" 메타데이터로 사용한다.
+    def __init__(self, chunk_size=4000):
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    def clean_text(self, text):
+        text = re.sub(r'\s+', ' ', text)
+        return text.strip()
+
+    def is_law_related_file(self, file_path):
+        file_name = os.path.basename(file_path).lower()
+        return 'law' in file_name
+
+    def detect_format(self, path):
+        with open(path, "rb") as f:
+            signature = f.read(8)
+        if signature.startswith(ZIP_SIGNATURE):
+            return "hwpx"
+        if signature == OLE_SIGNATURE:
+            return "hwp"
+        raise HWPFormatError("Unsupported file format: not an HWP or HWPX document")
+
+    def lazy_load(self, path, source=None):
+        source = source or path
+        paragraphs = self.hwpx_paragraphs(path) if self.detect_format(path) == "hwpx" else self.hwp_paragraphs(path)
+        try:
+            yield from self._chunk_paragraphs(paragraphs, source)
+        except FORMAT_ERRORS as e:
+            raise HWPFormatError(f"Corrupt HWP/HWPX document: {str(e)}") from e
+
+    def _chunk_paragraphs(self, paragraphs, source):
+        # 같은 구역의 문단을 chunk_size 글자까지 모아 하나의 청크로 만든다.
+        buffer, buffer_len, current_section = [], 0, None
+        for section, paragraph in paragraphs:
+            paragraph = self.clean_text(paragraph)
+            if not paragraph:
+                continue
+            if current_section is not None and (section != current_section or buffer_len + len(paragraph) > self.chunk_size):
+                if buffer:
+                    yield self.make_document(" ".join(buffer), source, current_section)
+                buffer, buffer_len = [], 0
+            current_section = section
+
+            while len(paragraph) > self.chunk_size:
+                yield self.make_document(paragraph[:self.chunk_size], source, section)
+                paragraph = paragraph[self.chunk_size:]
+            buffer.append(paragraph)
+            buffer_len += len(paragraph) + 1
+
+        if buffer:
+            yield self.make_document(" ".join(buffer), source, current_section)
+
+    def load_and_split(self, path, source=None):
+        return list(self.lazy_load(path, source))
+
+    def make_document(self, text, source, section):
+        return Document(page_content=text, metadata={"source": source, "page": section})
+
+    def hwpx_paragraphs(self, path):
+        with zipfile.ZipFile(path) as archive:
+            sections = [name for name in archive.namelist() if re.fullmatch(r'Contents/section\d+\.xml', name)]
+            sections.sort(key=lambda name: int(re.search(r'\d+', name.rsplit('/', 1)[-1]).group()))
+
+            for section_index, name in enumerate(sections):
+                with archive.open(name) as stream:
+                    yield from ((section_index, text) for text in self._iter_hwpx_section(stream))
+
+    def _iter_hwpx_section(self, stream):
+        # iterparse로 문단(<hp:p>)이 끝날 때마다 텍스트를 내보내고 처리한 요소는 바로 비운다.
+        root = None
+        depth = 0
+        parts = {}
+
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            name = local_name(elem.tag)
+            if event == "start":
+                if root is None:
+                    root = elem
+                if name == "p":
+                    depth += 1
+                    parts[depth] = []
+                continue
+
+            if name == "t" and depth:
+                # <hp:t> 안의 탭/줄바꿈 같은 자식 요소 뒤 텍스트(tail)까지 포함한다.
+                parts[depth].append(elem.text or "")
+                for child in elem:
+                    parts[depth].append(" " if local_name(child.tag) in ("tab", "lineBreak") else "")
+                    parts[depth].append(child.tail or "")
+            elif name == "p" and depth:
+                text = "".join(parts.pop(depth))
+                depth -= 1
+                if text.strip():
+                    yield text
+                elem.clear()
+                if depth == 0 and root is not None:
+                    root.clear()
+
+    def hwp_paragraphs(self, path):
+        if olefile is None:
+            raise HWPDependencyError("olefile is required to read legacy HWP files (pip install olefile)")
+
+        try:
+            ole = olefile.OleFileIO(path)
+        except OSError as e:
+            raise HWPFormatError(f"Invalid HWP container: {str(e)}") from e
+
+        with ole:
+            try:
+                header = ole.openstream("FileHeader").read()
+            except OSError as e:
+                raise HWPFormatError(f"Invalid HWP container: {str(e)}") from e
+            if not header.startswith(b"HWP Document File"):
+                raise HWPFormatError("Invalid HWP file header")
+            flags = struct.unpack_from("<I", header, 36)[0]
+            if flags & 0x2:
+                raise HWPFormatError("Password-protected HWP files are not supported")
+            if flags & 0x4:
+                raise HWPFormatError("Distribution (read-only) HWP files are not supported")
+            compressed = bool(flags & 0x1)
+
+            sections = [entry for entry in ole.listdir() if len(entry) == 2 and entry[0] == "BodyText" and entry[1].startswith("Section")]
+            sections.sort(key=lambda entry: int(entry[1][len("Section"):] or 0))
+
+            for section_index, entry in enumerate(sections):
+                stream = ole.openstream(entry)
+                for tag, payload in self._iter_hwp_records(stream, compressed):
+                    if tag == HWPTAG_PARA_TEXT:
+                        text = self._decode_para_text(payload)
+                        if text.strip():
+                            yield section_index, text
+
+    def _iter_hwp_records(self, stream, compressed):
+        # BodyText 구역 스트림을 조금씩 읽어 압축을 풀면서, 완성된 레코드만 꺼낸다.
+        # 압축 해제도 READ_SIZE 단위로 끊어, 버퍼는 MAX_RECORD_SIZE + READ_SIZE 정도를 넘지 않는다.
+        decompressor = zlib.decompressobj(-15) if compressed else None
+        buffer = bytearray()
+
+        while True:
+            chunk = stream.read(READ_SIZE)
+            if not chunk:
+                break
+            if decompressor is None:
+                buffer += chunk
+                yield from self._drain_records(buffer)
+                continue
+            while chunk:
+                buffer += decompressor.decompress(chunk, READ_SIZE)
+                yield from self._drain_records(buffer)
+                chunk = decompressor.unconsumed_tail
+
+        if decompressor:
+            buffer += decompressor.flush()
+            yield from self._drain_records(buffer)
+
+    def _drain_records(self, buffer):
+        offset = 0
+        while len(buffer) - offset >= 4:
+            header = struct.unpack_from("<I", buffer, offset)[0]
+            tag = header & 0x3FF
+            size = (header >> 20) & 0xFFF
+            header_size = 4
+            if size == 0xFFF:
+                if len(buffer) - offset < 8:
+                    break
+                size = struct.unpack_from("<I", buffer, offset + 4)[0]
+                header_size = 8
+            if size > MAX_RECORD_SIZE:
+                raise HWPFormatError(f"HWP record of {size} bytes exceeds the {MAX_RECORD_SIZE} byte limit")
+            if len(buffer) - offset < header_size + size:
+                break
+            start = offset + header_size
+            yield tag, bytes(buffer[start:start + size])
+            offset = start + size
+        del buffer[:offset]
+
+    def _decode_para_text(self, payload):
+        units = array("H")
+        units.frombytes(payload[:len(payload) - len(payload) % 2])
+        if sys.byteorder != "little":
+            units.byteswap()
+
+        out = io.StringIO()
+        i = 0
+        while i < len(units):
+            code = units[i]
+            if code >= 32:
+                # 제어 문자가 나올 때까지의 일반 글자를 한 번에 디코드한다.
+                start = i
+                while i < len(units) and units[i] >= 32:
+                    i += 1
+                out.write(payload[start * 2:i * 2].decode("utf-16-le", errors="ignore"))
+                continue
+            out.write(CONTROL_REPLACEMENTS.get(code, ""))
+            i += 1 if code in CHAR_CONTROLS else 8
+        return out.getvalue()
@@ -0,0 +1,691 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import fcntl
+import logging
+import tempfile
+import threading
+from array import array
+import numpy as np
+from langchain.schema import Document
+from app.services.document_store import NO_PAGE, page_of
+
+PARTITIONS = ("general", "law")
+CURRENT_MARKER = "CURRENT"
+LOCK_FILE = ".writer.lock"
+
+# 세그먼트별 스냅샷 파일 (v{버전}/{파티션}.{세그먼트}.{이름})
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+PAGES_FILE = "pages.npy"
+SOURCE_IDS_FILE = "source_ids.npy"
+HASHES_FILE = "hashes.npy"
+REVISIONS_FILE = "revisions.npy"
+ALIVE_FILE = "alive.npy"
+# 1차 검색용 양자화 코드 (int8: 차원별 스케일, binary: 부호 비트)
+INT8_CODES_FILE = "int8_codes.npy"
+INT8_SCALES_FILE = "int8_scales.npy"
+BINARY_CODES_FILE = "binary_codes.npy"
+# 발행 전 세그먼트의 벡터 (float32 행을 이어 붙인 원시 파일)
+PENDING_VECTORS_FILE = "vectors.f32"
+SEGMENT_FILES = (
+    VECTORS_FILE, TEXTS_FILE, OFFSETS_FILE, PAGES_FILE, SOURCE_IDS_FILE, HASHES_FILE, REVISIONS_FILE, ALIVE_FILE,
+    INT8_CODES_FILE, INT8_SCALES_FILE, BINARY_CODES_FILE,
+)
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# 세그먼트가 이보다 많아지면 압축 때 하나로 합친다 (검색은 세그먼트마다 따로 수행된다).
+MAX_SEGMENTS = 16
+# 양자화 코드를 한 번에 처리하는 행 수 (임시 메모리 상한)
+SCAN_BLOCK_ROWS = 4096
+# 바이트별 1의 개수 (해밍 거리 계산용), numpy 2.0 이상에서는 bitwise_count를 사용한다.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+popcount = getattr(np, "bitwise_count", POPCOUNT.__getitem__)
+
+
+def partition_name(is_law_related):
+    return "law" if is_law_related else "general"
+
+
+def version_dirname(version):
+    return f"v{version:08d}"
+
+
+def quantize_int8(vectors, scales=None):
+    if scales is None:
+        scales = np.abs(vectors).max(axis=0) if len(vectors) else np.ones(vectors.shape[1], dtype=np.float32)
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.round(vectors / scales * 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors):
+    return np.packbits(vectors > 0, axis=1)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def read_marker(root):
+    try:
+        with open(os.path.join(root, CURRENT_MARKER), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotSegment:
+    # 한 번 쓰면 바뀌지 않는 행 묶음. 업로드마다 새 세그먼트가 생기고, 이후 버전에서는 하드링크로 재사용된다.
+    # tombstone 표시(alive)만 세그먼트별로 따로 다시 쓴다.
+    def __init__(self, path, name, info):
+        self.id = info.get("id")
+        self.count = info["count"]
+        self.live = info.get("live", self.count)
+        # 세그먼트가 도입되기 전 스냅샷은 파티션 전체가 id 없는 하나의 세그먼트다.
+        self.prefix = os.path.join(path, f"{name}.{self.id}" if self.id else name)
+        self._texts = b""
+
+        self.vectors = np.load(f"{self.prefix}.{VECTORS_FILE}", mmap_mode="r")
+        self.offsets = np.load(f"{self.prefix}.{OFFSETS_FILE}", mmap_mode="r")
+        self.pages = np.load(f"{self.prefix}.{PAGES_FILE}", mmap_mode="r")
+        self.source_ids = np.load(f"{self.prefix}.{SOURCE_IDS_FILE}", mmap_mode="r")
+        self.hashes = np.load(f"{self.prefix}.{HASHES_FILE}", mmap_mode="r")
+        self.row_revisions = np.load(f"{self.prefix}.{REVISIONS_FILE}", mmap_mode="r")
+        self.alive = np.load(f"{self.prefix}.{ALIVE_FILE}", mmap_mode="r")
+        self.int8_codes = self._load_optional(f"{self.prefix}.{INT8_CODES_FILE}")
+        self.int8_scales = self._load_optional(f"{self.prefix}.{INT8_SCALES_FILE}")
+        self.binary_codes = self._load_optional(f"{self.prefix}.{BINARY_CODES_FILE}")
+
+        self._texts_file = open(f"{self.prefix}.{TEXTS_FILE}", "rb")
+        if os.fstat(self._texts_file.fileno()).st_size > 0:
+            self._texts = mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # 살아 있는 청크의 본문 크기. 발행 때 manifest에 기록되며, 기록이 없는 이전 스냅샷만 직접 계산한다.
+        self.live_bytes = info["live_bytes"] if "live_bytes" in info else self.alive_bytes(self.alive)
+
+    def _load_optional(self, path):
+        # 양자화 코드가 없는 스냅샷은 전체 정밀도 검색으로 대체한다.
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def alive_bytes(self, alive):
+        return int(np.diff(np.asarray(self.offsets))[np.asarray(alive).astype(bool)].sum())
+
+    def text_bytes(self, row):
+        return self._texts[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def approximate_scores(self, query, quantization):
+        if quantization == "int8" and self.int8_codes is not None:
+            weights = query * self.int8_scales / 127
+            scores = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, SCAN_BLOCK_ROWS):
+                block = self.int8_codes[start:start + SCAN_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ weights
+            return scores
+        if quantization == "binary" and self.binary_codes is not None:
+            query_bits = np.packbits(query > 0)
+            scores = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, SCAN_BLOCK_ROWS):
+                block = self.binary_codes[start:start + SCAN_BLOCK_ROWS]
+                # 해밍 거리가 작을수록 가깝다.
+                scores[start:start + len(block)] = -popcount(np.bitwise_xor(block, query_bits)).sum(axis=1, dtype=np.int32)
+            return scores
+        return None
+
+    def search(self, query, k, quantization="none", rescore_factor=4):
+        # 정규화된 query로 이 세그먼트의 상위 k개 (세그먼트 내 행 번호, 점수)를 구한다.
+        k = min(k, self.live)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # 양자화 코드로 후보를 추린 뒤, 후보만 전체 정밀도 벡터로 다시 점수를 매긴다.
+        # 전체 정밀도 벡터는 mmap이므로 후보 행만 페이지 인된다.
+        approximate = self.approximate_scores(query, quantization)
+        if approximate is not None:
+            if self.live < self.count:
+                approximate = np.where(self.alive.astype(bool), approximate, -np.inf)
+            candidates_count = min(self.live, k * rescore_factor)
+            candidates = np.sort(np.argpartition(-approximate, candidates_count - 1)[:candidates_count])
+            exact = self.vectors[candidates] @ query
+            order = np.argsort(-exact)[:k]
+            return candidates[order], exact[order]
+
+        scores = self.vectors @ query
+        if self.live < self.count:
+            # tombstone 처리된 청크는 검색 결과에서 제외한다.
+            scores = np.where(self.alive.astype(bool), scores, -np.inf)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def close(self):
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+
+
+class SnapshotPartition:
+    # 하나의 파티션(general/law)을 읽기 전용 mmap으로 연다. 모든 워커가 같은 페이지 캐시를 공유한다.
+    # 행 번호는 세그먼트를 순서대로 이어 붙인 전역 번호이며, 압축(compact) 전까지는 바뀌지 않는다.
+    def __init__(self, path, name, info):
+        self.path = path
+        self.name = name
+        self.count = info["count"]
+        self.live = info.get("live", self.count)
+        self.dim = info["dim"]
+        self.sources = info["sources"]
+        self.revisions = info.get("revisions", {})
+        self.generation = info.get("generation", 0)
+
+        segments = info.get("segments")
+        if segments is None:
+            segments = [{"id": None, "count": self.count, "live": self.live}] if self.count else []
+        self.segments = [SnapshotSegment(path, name, segment) for segment in segments]
+        self.bases = np.cumsum([0] + [segment.count for segment in self.segments])
+
+    @property
+    def tombstones(self):
+        return self.count - self.live
+
+    @property
+    def tombstone_ratio(self):
+        return self.tombstones / self.count if self.count else 0.0
+
+    @property
+    def live_bytes(self):
+        return sum(segment.live_bytes for segment in self.segments)
+
+    def locate(self, row):
+        index = int(np.searchsorted(self.bases, row, side="right")) - 1
+        return self.segments[index], row - int(self.bases[index])
+
+    def document(self, row):
+        segment, local = self.locate(row)
+        metadata = {
+            "source": self.sources[int(segment.source_ids[local])],
+            "revision": int(segment.row_revisions[local]),
+            "is_law_related": self.name == "law",
+        }
+        if int(segment.pages[local]) != NO_PAGE:
+            metadata["page"] = int(segment.pages[local])
+        return Document(page_content=segment.text_bytes(local).decode("utf-8"), metadata=metadata)
+
+    def live_hashes(self, exclude_source=None, alive=None):
+        # alive에는 아직 발행되지 않은 세그먼트별 tombstone 표시를 넘길 수 있다.
+        exclude = self.sources.index(exclude_source) if exclude_source in self.sources else None
+        hashes = set()
+        for index, segment in enumerate(self.segments):
+            mask = np.asarray(alive[index] if alive and index in alive else segment.alive).astype(bool)
+            if exclude is not None:
+                mask &= np.asarray(segment.source_ids) != exclude
+            hashes.update(bytes(h) for h in np.asarray(segment.hashes)[mask])
+        return hashes
+
+    def iter_rows(self, start=0, source=None, page=None):
+        # 필터에 맞는 살아 있는 전역 행 번호를 순서대로 내보낸다. 본문은 읽지 않는다.
+        if source is not None and source not in self.sources:
+            return
+        source_id = self.sources.index(source) if source is not None else None
+        for index, segment in enumerate(self.segments):
+            base = int(self.bases[index])
+            if base + segment.count <= start:
+                continue
+            offset = max(0, start - base)
+            mask = np.asarray(segment.alive[offset:]).astype(bool)
+            if source_id is not None:
+                mask &= segment.source_ids[offset:] == source_id
+            if page is not None:
+                mask &= segment.pages[offset:] == page
+            for row in np.flatnonzero(mask):
+                yield base + offset + int(row)
+
+    def search(self, query_vector, k, quantization="none", rescore_factor=4):
+        if self.live == 0:
+            return []
+        query = np.array(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        # 세그먼트별 상위 k개를 전체 정밀도 점수로 구한 뒤 합쳐서 다시 고른다.
+        results = []
+        for base, segment in zip(self.bases, self.segments):
+            rows, scores = segment.search(query, k, quantization, rescore_factor)
+            results.extend((int(base) + int(row), float(score)) for row, score in zip(rows, scores))
+        results.sort(key=lambda result: -result[1])
+        return results[:k]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+class IndexSnapshot:
+    def __init__(self, root, version):
+        self.version = version
+        self.path = os.path.join(root, version)
+        with open(os.path.join(self.path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.partitions = {
+            name: SnapshotPartition(self.path, name, info)
+            for name, info in self.manifest["partitions"].items()
+        }
+
+    def partition(self, is_law_related):
+        return self.partitions.get(partition_name(is_law_related))
+
+    def close(self):
+        for partition in self.partitions.values():
+            partition.close()
+
+
+class IndexSnapshotReader:
+    # 버전 마커(CURRENT)를 주기적으로 확인하고, 변경되면 새 스냅샷으로 원자적으로 교체한다.
+    def __init__(self, root, refresh_interval=2.0):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self.logger = logging.getLogger(__name__)
+        self._snapshot = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.refresh_interval:
+            with self._lock:
+                if now - self._checked_at >= self.refresh_interval:
+                    self._checked_at = now
+                    self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        version = read_marker(self.root)
+        if version is None or (self._snapshot is not None and self._snapshot.version == version):
+            return
+        try:
+            snapshot = IndexSnapshot(self.root, version)
+        except (OSError, ValueError, KeyError) as e:
+            # 오래된 버전이 정리되는 도중일 수 있으므로 다음 주기에 다시 시도한다.
+            self.logger.warning(f"Failed to open index snapshot {version}: {str(e)}")
+            return
+        # 이전 스냅샷은 진행 중인 검색이 참조를 놓으면 GC와 함께 해제된다.
+        self._snapshot = snapshot
+        self.logger.info(f"Switched to index snapshot {version}")
+
+    def invalidate(self):
+        self._checked_at = float("-inf")
+
+
+class _PartitionDraft:
+    # 새 버전에서 한 파티션이 어떻게 바뀌는지 기록한다. 바뀌지 않은 세그먼트 파일은 하드링크로 재사용된다.
+    def __init__(self, old):
+        self.old = old
+        self.sources = list(old.sources) if old is not None else []
+        self.revisions = dict(old.revisions) if old is not None else {}
+        # 세그먼트 번호 -> 새 tombstone 표시
+        self.alive = {}
+        self.appended = None
+        self.compacted = False
+
+    @property
+    def changed(self):
+        return bool(self.alive) or self.appended is not None or self.compacted
+
+    def segment_alive(self, index):
+        if index in self.alive:
+            return self.alive[index]
+        return np.asarray(self.old.segments[index].alive)
+
+    def live_hashes(self):
+        return self.old.live_hashes(alive=self.alive) if self.old is not None else set()
+
+    def source_id(self, source):
+        if source not in self.sources:
+            self.sources.append(source)
+        return self.sources.index(source)
+
+    def tombstone(self, source):
+        if self.old is None or source not in self.old.sources:
+            return 0
+        source_id = self.old.sources.index(source)
+        removed = 0
+        for index, segment in enumerate(self.old.segments):
+            alive = self.segment_alive(index)
+            rows = (np.asarray(segment.source_ids) == source_id) & (alive == 1)
+            count = int(rows.sum())
+            if count:
+                alive = np.array(alive, dtype=np.uint8)
+                alive[rows] = 0
+                self.alive[index] = alive
+                removed += count
+        # 삭제도 새 리비전으로 기록한다.
+        self.revisions[source] = self.revisions.get(source, 0) + 1
+        return removed
+
+
+class PendingSegment:
+    # 아직 발행되지 않은 새 세그먼트. 큰 문서를 배치로 나눠 임베딩하는 동안 본문과 벡터는 임시 파일에만 쌓고,
+    # 잠금과 새 버전 발행은 commit()에서 한 번만 한다. commit 전에 실패하면 인덱스는 바뀌지 않는다.
+    def __init__(self, writer, is_law_related, replace_source=None):
+        self.writer = writer
+        self.name = partition_name(is_law_related)
+        self.replace_source = replace_source
+        self.path = tempfile.mkdtemp(prefix=".pending-", dir=writer.root)
+        self._texts = open(os.path.join(self.path, TEXTS_FILE), "wb")
+        self._vectors = open(os.path.join(self.path, PENDING_VECTORS_FILE), "wb")
+        self.dim = None
+        self.sources = []
+        self.lengths = array('q')
+        self.pages = array('i')
+        self.source_ids = array('i')
+        self.hashes = bytearray()
+        # 이미 발행된 문서는 임베딩하지 않는다. 잠금 없이 읽으므로 commit 때 다시 확인한다.
+        self._seen = writer._existing_hashes(self.name, replace_source)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, documents, hashes, embed_documents):
+        kept = []
+        for doc, doc_hash in zip(documents, hashes):
+            if doc_hash not in self._seen:
+                self._seen.add(doc_hash)
+                kept.append(doc)
+                self.hashes += doc_hash
+        if not kept:
+            return 0
+
+        vectors = normalize(embed_documents([doc.page_content for doc in kept]))
+        self.dim = vectors.shape[1]
+        self._vectors.write(vectors.tobytes())
+        for doc in kept:
+            text = doc.page_content.encode("utf-8")
+            self._texts.write(text)
+            self.lengths.append(len(text))
+            self.pages.append(page_of(doc.metadata))
+            self.source_ids.append(self._source_id(str(doc.metadata.get("source", ""))))
+        return len(kept)
+
+    def _source_id(self, source):
+        if source not in self.sources:
+            self.sources.append(source)
+        return self.sources.index(source)
+
+    def texts(self, keep):
+        with open(os.path.join(self.path, TEXTS_FILE), "rb") as f:
+            for length, kept in zip(self.lengths, keep):
+                chunk = f.read(length)
+                if kept:
+                    yield chunk
+
+    def vectors(self):
+        return np.memmap(os.path.join(self.path, PENDING_VECTORS_FILE), dtype=np.float32, mode="r", shape=(len(self), self.dim))
+
+    def commit(self):
+        # replace_source의 이전 청크 tombstone과 새 세그먼트 추가를 한 버전으로 발행한다.
+        self._texts.close()
+        self._vectors.close()
+
+        def update(drafts):
+            if self.replace_source is not None:
+                for draft in drafts.values():
+                    draft.tombstone(self.replace_source)
+            return self.writer._append(drafts[self.name], self)
+
+        return self.writer._locked(update)
+
+    def close(self):
+        self._texts.close()
+        self._vectors.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class IndexSnapshotWriter:
+    # 파일 잠금으로 한 번에 하나의 프로세스만 새 버전을 발행한다.
+    # 추가는 새 세그먼트로, 삭제는 해당 세그먼트의 tombstone 표시로만 기록하고, 전체를 다시 쓰는 것은 압축뿐이다.
+    def __init__(self, root, keep_versions=3, max_segments=MAX_SEGMENTS):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.max_segments = max_segments
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(root, exist_ok=True)
+
+    def publish(self, is_law_related, documents, hashes, embed_documents, replace_source=None):
+        # replace_source가 주어지면 해당 출처의 이전 청크를 tombstone 처리하고 새 청크를 같은 버전에 추가한다.
+        # 임베딩은 네트워크 호출이므로 잠금 밖에서 계산하고, 잠금 안에서는 중복만 다시 확인한다.
+        with self.pending(is_law_related, replace_source) as pending:
+            pending.add(documents, hashes, embed_documents)
+            return pending.commit()
+
+    def pending(self, is_law_related, replace_source=None):
+        return PendingSegment(self, is_law_related, replace_source)
+
+    def delete_source(self, source):
+        def update(drafts):
+            return sum(draft.tombstone(source) for draft in drafts.values())
+
+        return self._locked(update)
+
+    def compact(self, is_law_related, min_ratio=0.0):
+        # tombstone 비율이 임계값을 넘었거나 세그먼트가 너무 많아지면 살아 있는 행을 하나의 세그먼트로 합친다.
+        name = partition_name(is_law_related)
+
+        def update(drafts):
+            old = drafts[name].old
+            if old is None:
+                return 0
+            too_many_tombstones = old.tombstones > 0 and old.tombstone_ratio >= min_ratio
+            if not too_many_tombstones and len(old.segments) <= self.max_segments:
+                return 0
+            drafts[name].compacted = True
+            return old.tombstones
+
+        return self._locked(update)
+
+    def _locked(self, update):
+        with open(os.path.join(self.root, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                previous_version = read_marker(self.root)
+                previous = IndexSnapshot(self.root, previous_version) if previous_version else None
+                try:
+                    drafts = {name: _PartitionDraft(previous.partitions.get(name) if previous else None) for name in PARTITIONS}
+                    result = update(drafts)
+                    if any(draft.changed for draft in drafts.values()):
+                        self._commit(previous, drafts)
+                    return result
+                finally:
+                    if previous is not None:
+                        previous.close()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _existing_hashes(self, name, exclude_source=None):
+        # 현재 버전에 이미 있는 문서를 미리 걸러 불필요한 임베딩 호출을 줄인다. 잠금 없이 읽으므로 결과는 힌트일 뿐이다.
+        version = read_marker(self.root)
+        if version is None:
+            return set()
+        try:
+            snapshot = IndexSnapshot(self.root, version)
+        except (OSError, ValueError, KeyError):
+            return set()
+        try:
+            partition = snapshot.partitions.get(name)
+            if partition is None or partition.live == 0:
+                return set()
+            return partition.live_hashes(exclude_source=exclude_source)
+        finally:
+            snapshot.close()
+
+    def _append(self, draft, pending):
+        # 임베딩을 계산하는 동안 다른 워커가 발행한 (살아 있는) 문서는 건너뛴다.
+        existing = draft.live_hashes()
+        hashes = np.frombuffer(bytes(pending.hashes), dtype=np.uint8).reshape(-1, 16)
+        keep = np.fromiter((bytes(h) not in existing for h in hashes), dtype=bool, count=len(pending))
+        count = int(keep.sum())
+        if not count:
+            return 0
+
+        # 세그먼트 안의 출처 번호를 파티션의 출처 번호로 바꾼다.
+        local_ids = np.frombuffer(pending.source_ids, dtype=np.int32)[keep]
+        source_ids = np.array([draft.source_id(source) for source in pending.sources], dtype=np.int32)
+        revisions = np.array([draft.revisions.get(source, 0) for source in pending.sources], dtype=np.int32)
+        lengths = np.frombuffer(pending.lengths, dtype=np.int64)[keep]
+        draft.appended = {
+            "texts": pending.texts(keep),
+            "vectors": pending.vectors(),
+            "rows": np.flatnonzero(keep),
+            "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "pages": np.frombuffer(pending.pages, dtype=np.int32)[keep],
+            "source_ids": source_ids[local_ids],
+            "hashes": hashes[keep],
+            "revisions": revisions[local_ids],
+            "alive": np.ones(count, dtype=np.uint8),
+        }
+        return count
+
+    def _commit(self, previous, drafts):
+        version_number = int(previous.version[1:]) + 1 if previous else 1
+        version = version_dirname(version_number)
+        tmp_path = os.path.join(self.root, f".tmp-{version}-{os.getpid()}")
+        os.makedirs(tmp_path)
+
+        manifest = {"version": version, "created_at": time.time(), "partitions": {}}
+        for name, draft in drafts.items():
+            if draft.old is None and draft.appended is None:
+                continue
+            manifest["partitions"][name] = self._write_partition(tmp_path, name, draft, f"s{version_number:08d}")
+
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        os.rename(tmp_path, os.path.join(self.root, version))
+        self._write_marker(version)
+        self._remove_old_versions(version_number)
+        self.logger.info(f"Published index snapshot {version}.")
+        return version
+
+    def _write_partition(self, path, name, draft, segment_id):
+        old = draft.old
+        info = {
+            "sources": draft.sources,
+            "revisions": draft.revisions,
+            "generation": old.generation if old is not None else 0,
+        }
+        segments = []
+
+        if draft.compacted:
+            # 살아 있는 행만 하나의 새 세그먼트로 다시 쓴다. 행 번호가 바뀌므로 세대 번호를 올린다.
+            info["generation"] += 1
+            parts = [(segment, np.flatnonzero(np.asarray(segment.alive))) for segment in old.segments]
+            texts = [segment.text_bytes(row) for segment, rows in parts for row in rows]
+            if texts:
+                lengths = np.fromiter((len(b) for b in texts), dtype=np.int64, count=len(texts))
+                self._save_segment(os.path.join(path, f"{name}.{segment_id}"), {
+                    "texts": texts,
+                    "vectors": np.concatenate([segment.vectors[rows] for segment, rows in parts]),
+                    "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                    "pages": np.concatenate([segment.pages[rows] for segment, rows in parts]),
+                    "source_ids": np.concatenate([segment.source_ids[rows] for segment, rows in parts]),
+                    "hashes": np.concatenate([segment.hashes[rows] for segment, rows in parts]),
+                    "revisions": np.concatenate([segment.row_revisions[rows] for segment, rows in parts]),
+                    "alive": np.ones(len(texts), dtype=np.uint8),
+                })
+                segments.append({"id": segment_id, "count": len(texts), "live": len(texts), "live_bytes": int(lengths.sum())})
+        else:
+            # 기존 세그먼트는 하드링크로 가져오고, tombstone 표시가 바뀐 세그먼트만 alive 파일을 새로 쓴다.
+            for index, segment in enumerate(old.segments if old is not None else []):
+                changed = index in draft.alive
+                self._link_segment(segment, path, skip=(ALIVE_FILE,) if changed else ())
+                alive = draft.segment_alive(index)
+                live_bytes = segment.live_bytes
+                if changed:
+                    np.save(os.path.join(path, f"{os.path.basename(segment.prefix)}.{ALIVE_FILE}"), alive)
+                    live_bytes = segment.alive_bytes(alive)
+                segments.append({"id": segment.id, "count": segment.count, "live": int(np.count_nonzero(alive)), "live_bytes": live_bytes})
+
+            if draft.appended is not None:
+                self._save_segment(os.path.join(path, f"{name}.{segment_id}"), draft.appended)
+                count = len(draft.appended["alive"])
+                live_bytes = int(draft.appended["offsets"][-1])
+                segments.append({"id": segment_id, "count": count, "live": count, "live_bytes": live_bytes})
+
+        dim = old.dim if old is not None else int(draft.appended["vectors"].shape[1])
+        return {
+            **info,
+            "count": sum(segment["count"] for segment in segments),
+            "live": sum(segment["live"] for segment in segments),
+            "dim": dim,
+            "segments": segments,
+        }
+
+    def _save_segment(self, prefix, arrays):
+        with open(f"{prefix}.{TEXTS_FILE}", "wb") as f:
+            for chunk in arrays["texts"]:
+                f.write(chunk)
+        np.save(f"{prefix}.{OFFSETS_FILE}", arrays["offsets"])
+        np.save(f"{prefix}.{PAGES_FILE}", arrays["pages"])
+        np.save(f"{prefix}.{SOURCE_IDS_FILE}", arrays["source_ids"])
+        np.save(f"{prefix}.{HASHES_FILE}", arrays["hashes"])
+        np.save(f"{prefix}.{REVISIONS_FILE}", arrays["revisions"])
+        np.save(f"{prefix}.{ALIVE_FILE}", arrays["alive"])
+        self._save_vectors(prefix, arrays["vectors"], arrays.get("rows"))
+
+    def _save_vectors(self, prefix, vectors, rows=None):
+        # 벡터와 양자화 코드를 SCAN_BLOCK_ROWS 행씩 나눠 써서, 큰 세그먼트도 한꺼번에 메모리에 올리지 않는다.
+        # rows가 주어지면 해당 행만 순서대로 쓴다.
+        count = len(vectors) if rows is None else len(rows)
+        dim = vectors.shape[1]
+        saved = np.lib.format.open_memmap(f"{prefix}.{VECTORS_FILE}", mode="w+", dtype=np.float32, shape=(count, dim))
+        # 양자화 스케일은 세그먼트마다 따로 계산한다.
+        scales = np.zeros(dim, dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS] if rows is None else vectors[rows[start:start + SCAN_BLOCK_ROWS]]
+            saved[start:start + len(block)] = block
+            np.maximum(scales, np.abs(saved[start:start + len(block)]).max(axis=0), out=scales)
+        scales[scales == 0] = 1.0
+        np.save(f"{prefix}.{INT8_SCALES_FILE}", scales)
+
+        int8_codes = np.lib.format.open_memmap(f"{prefix}.{INT8_CODES_FILE}", mode="w+", dtype=np.int8, shape=(count, dim))
+        binary_codes = np.lib.format.open_memmap(f"{prefix}.{BINARY_CODES_FILE}", mode="w+", dtype=np.uint8, shape=(count, (dim + 7) // 8))
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            block = saved[start:start + SCAN_BLOCK_ROWS]
+            int8_codes[start:start + len(block)] = quantize_int8(block, scales)[0]
+            binary_codes[start:start + len(block)] = quantize_binary(block)
+        for array_map in (saved, int8_codes, binary_codes):
+            array_map.flush()
+
+    def _link_segment(self, segment, dst_path, skip=()):
+        for file_name in SEGMENT_FILES:
+            if file_name in skip:
+                continue
+            src = f"{segment.prefix}.{file_name}"
+            dst = os.path.join(dst_path, f"{os.path.basename(segment.prefix)}.{file_name}")
+            if not os.path.exists(src):
+                continue
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+
+    def _write_marker(self, version):
+        tmp_marker = os.path.join(self.root, f".{CURRENT_MARKER}.{os.getpid()}")
+        with open(tmp_marker, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_marker, os.path.join(self.root, CURRENT_MARKER))
+
+    def _remove_old_versions(self, current_number):
+        # 이미 매핑된 파일은 unlink되어도 기존 워커에서 계속 읽을 수 있다.
+        for entry in os.listdir(self.root):
+            if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) <= current_number - self.keep_versions:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
@@ -0,0 +1,107 @@
+import time
+import hashlib
+import logging
+import threading
+import numpy as np
+
+
+def fetch_information_rows():
+    # app.db.database는 import 시 DB에 연결하므로 실제로 읽을 때 가져온다.
+    from app.db import models, database
+
+    db = database.SessionLocal()
+    try:
+        return db.query(models.Information).filter(models.Information.response_text.isnot(None)).all()
+    finally:
+        db.close()
+
+
+def normalize_rows(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IntentRouter:
+    # 빠른 응답 버튼(All_information)의 이름과 답변을 임베딩해 두고,
+    # 질문이 충분히 비슷하면 RAG 체인 없이 저장된 답변을 바로 돌려준다.
+    # 표는 refresh_interval마다 백그라운드 스레드에서 다시 읽고, 새로 생기거나 바뀐 문장만 임베딩한다.
+    def __init__(self, embedding_model, threshold=0.9, refresh_interval=300.0, fetch_rows=fetch_information_rows):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.fetch_rows = fetch_rows
+        self.logger = logging.getLogger(__name__)
+
+        # (의도 목록, 정규화된 임베딩 행렬, 행별 의도 번호)를 한 번에 교체해 검색 중에도 일관된 값을 읽는다.
+        self._index = ([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int32))
+        # 문장 MD5 다이제스트 -> 정규화된 임베딩
+        self._embeddings = {}
+        self._next_load = 0.0
+        self._refresh_thread = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        rows = self.fetch_rows()
+
+        intents, keys, row_intents = [], [], []
+        missing = {}
+        for row in rows:
+            intent_id = len(intents)
+            intents.append({"button_name": row.button_name, "response_text": row.response_text, "link": row.link})
+            # 버튼 이름과 답변 각각을 한 행으로 두고, 어느 쪽과 가까워도 같은 의도로 본다.
+            for text in (row.button_name, row.response_text):
+                if text and text.strip():
+                    key = hashlib.md5(text.encode("utf-8")).digest()
+                    if key not in self._embeddings:
+                        missing[key] = text
+                    keys.append(key)
+                    row_intents.append(intent_id)
+
+        # 이전 갱신에서 임베딩한 문장은 재사용하고, 표에서 사라진 문장은 버린다.
+        embeddings = {key: self._embeddings[key] for key in keys if key in self._embeddings}
+        if missing:
+            vectors = normalize_rows(self.embedding_model.embed_documents(list(missing.values())))
+            embeddings.update(zip(missing, vectors))
+
+        matrix = np.stack([embeddings[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        self._embeddings = embeddings
+        self._index = (intents, matrix, np.asarray(row_intents, dtype=np.int32))
+        self.logger.info(f"Loaded {len(intents)} intents ({len(missing)} new of {len(keys)} embeddings) for the FAQ fast path.")
+        return len(missing)
+
+    def refresh(self):
+        try:
+            self.load()
+        except Exception as e:
+            # DB나 임베딩 호출이 실패하면 기존 행렬을 유지하고 다음 주기에 다시 시도한다.
+            self.logger.error(f"Failed to load FAQ intents: {str(e)}", exc_info=True)
+
+    def ensure_loaded(self):
+        # 갱신은 요청 경로 밖에서 하고, 끝날 때까지는 이전 행렬로 계속 응답한다.
+        if time.monotonic() < self._next_load:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_load:
+                return
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._next_load = time.monotonic() + self.refresh_interval
+            self._refresh_thread = threading.Thread(target=self.refresh, name="faq-intent-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def match(self, query_vector):
+        self.ensure_loaded()
+        intents, matrix, row_intents = self._index
+        if matrix.shape[0] == 0:
+            return None
+
+        query = np.array(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        return {**intents[int(row_intents[best])], "score": float(scores[best])}
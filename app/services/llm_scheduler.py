@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+
+
+class SchedulerOverloaded(Exception):
+    def __init__(self, retry_after, message="LLM scheduler is overloaded"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SchedulerDeadlineExceeded(SchedulerOverloaded):
+    def __init__(self, retry_after):
+        super().__init__(retry_after, "LLM request missed its queue deadline")
+
+
+def is_rate_limited(error):
+    # openai.RateLimitError 및 429를 돌려주는 HTTP 예외 모두 status_code 속성을 가진다.
+    return getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        # amount 만큼의 토큰이 채워질 때까지 기다려야 하는 시간(초)
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Entry:
+    __slots__ = ("priority", "seq", "deadline", "tokens", "fn", "future", "task")
+
+    def __init__(self, priority, seq, deadline, tokens, fn, future):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.tokens = tokens
+        self.fn = fn
+        self.future = future
+        self.task = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    # LLM 호출 앞단의 로컬 스케줄러: 분당 요청/토큰 버킷, 마감 시간이 있는 우선순위 큐, 429 재시도.
+    # priority 값이 작을수록 먼저 처리된다.
+    def __init__(self, requests_per_minute, tokens_per_minute, max_queue_size=100, max_concurrency=16,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_size = max_queue_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._slots = None
+        self._dispatcher = None
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.retried = 0
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    @property
+    def queue_full(self):
+        return len(self._queue) >= self.max_queue_size
+
+    def retry_after(self):
+        # 현재 큐를 분당 요청 한도로 비우는 데 걸리는 시간을 대략적으로 안내한다.
+        seconds = (len(self._queue) + self.in_flight) / max(self.requests.rate, 1e-6)
+        return max(1, min(60, math.ceil(seconds)))
+
+    def check_capacity(self):
+        if self.queue_full:
+            self.rejected += 1
+            raise SchedulerOverloaded(self.retry_after())
+
+    async def submit(self, fn, tokens=1, priority=0, timeout=None):
+        self.check_capacity()
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        entry = _Entry(priority, next(self._seq), deadline, tokens, fn, loop.create_future())
+        heapq.heappush(self._queue, entry)
+        self.submitted += 1
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        # 모든 슬롯이 사용 중이어도 마감 시간이 지나면 큐에서 바로 만료시킨다.
+        expiry = loop.call_later(timeout, self._expire, entry) if timeout is not None else None
+
+        try:
+            return await entry.future
+        except asyncio.CancelledError:
+            # 요청이 취소되면 이미 시작된 LLM 호출도 취소하고, 아직 대기 중이면 큐에서 바로 뺀다.
+            if entry.task is not None:
+                entry.task.cancel()
+            else:
+                self._dequeue(entry)
+            raise
+        finally:
+            if expiry is not None:
+                expiry.cancel()
+
+    def _dequeue(self, entry):
+        try:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        except ValueError:
+            pass
+
+    def _expire(self, entry):
+        if entry.task is not None or entry.future.done():
+            return
+        self._dequeue(entry)
+        self.expired += 1
+        entry.future.set_exception(SchedulerDeadlineExceeded(self.retry_after()))
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "retried": self.retried,
+            "available_requests": round(self.requests.tokens, 2),
+            "available_tokens": round(self.tokens.tokens, 2),
+        }
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                entry = await self._next_ready()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            self.requests.consume(1)
+            self.tokens.consume(entry.tokens)
+            self.in_flight += 1
+            entry.task = asyncio.ensure_future(self._run(entry))
+
+    async def _next_ready(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            entry = self._queue[0]
+            now = time.monotonic()
+            if entry.future.done():
+                heapq.heappop(self._queue)
+                continue
+            if entry.deadline is not None and now >= entry.deadline:
+                heapq.heappop(self._queue)
+                self.expired += 1
+                entry.future.set_exception(SchedulerDeadlineExceeded(self.retry_after()))
+                continue
+
+            wait = max(self.requests.delay(1), self.tokens.delay(entry.tokens))
+            if wait <= 0:
+                return heapq.heappop(self._queue)
+
+            # 버킷이 채워지는 동안 더 높은 우선순위 요청이 들어오면 다시 선택한다.
+            if entry.deadline is not None:
+                wait = min(wait, entry.deadline - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, entry):
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = await entry.fn()
+                    break
+                except Exception as e:
+                    if not is_rate_limited(e):
+                        raise
+                    # 지수 백오프 + full jitter, 재시도 한도나 마감 시간을 넘기면 과부하로 응답한다.
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    out_of_time = entry.deadline is not None and time.monotonic() + delay >= entry.deadline
+                    if attempt >= self.max_retries or out_of_time:
+                        raise SchedulerOverloaded(self.retry_after(), "LLM provider rate limit exceeded") from e
+                    attempt += 1
+                    self.retried += 1
+                    self.logger.warning(f"LLM rate limited, retrying in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+                    self.requests.consume(1)
+            self.completed += 1
+            if not entry.future.done():
+                entry.future.set_result(result)
+        except asyncio.CancelledError:
+            if not entry.future.done():
+                entry.future.cancel()
+        except Exception as e:
+            self.failed += 1
+            if not entry.future.done():
+                entry.future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
@@ -0,0 +1,44 @@
+import asyncio
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    # 같은 키로 동시에 들어온 요청은 하나의 계산 결과(또는 예외)를 함께 기다린다.
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    async def do(self, key, fn):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # 한 요청이 취소되어도 다른 요청이 기다리는 공유 작업은 취소되지 않도록 보호한다.
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 기다리는 요청이 모두 취소되면 공유 작업도 취소한다.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
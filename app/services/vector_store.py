@@ -2,54 +2,309 @@ import os
 import logging
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
+from app.core.config import settings
+from app.services.index_snapshot import IndexSnapshotReader, IndexSnapshotWriter, QUANTIZATION_MODES, partition_name
+from app.services.document_store import DocumentStore
 import re
 import hashlib
+import threading
+
+class StaleCursorError(ValueError):
+    pass
+
 
 class VectorStore:
     def __init__(self):
         self.embedding_model = OpenAIEmbeddings()
         self.general_vector_store = None
         self.law_vector_store = None
-        self.general_documents = []
-        self.law_documents = []
+        self.general_documents = DocumentStore(is_law_related=False)
+        self.law_documents = DocumentStore(is_law_related=True)
+        # 중복 검사용 16바이트 MD5 다이제스트 (출처 + 본문 기준이므로 출처마다 자기 청크를 따로 가진다)
         self.document_hashes = set()
+        self.version = 0
         self.logger = logging.getLogger(__name__)
+        # 추가/삭제/압축은 한 번에 하나만 수행한다.
+        self._write_lock = threading.Lock()
+
+        # 스냅샷 모드에서는 문서와 인덱스를 프로세스마다 들고 있지 않고 공유 스냅샷을 매핑한다.
+        self.snapshot_reader = None
+        self.snapshot_writer = None
+        if settings.INDEX_SNAPSHOT_DIR:
+            if settings.VECTOR_QUANTIZATION not in QUANTIZATION_MODES:
+                raise ValueError(f"VECTOR_QUANTIZATION must be one of {', '.join(QUANTIZATION_MODES)}")
+            self.snapshot_reader = IndexSnapshotReader(settings.INDEX_SNAPSHOT_DIR, settings.INDEX_REFRESH_INTERVAL)
+            self.snapshot_writer = IndexSnapshotWriter(settings.INDEX_SNAPSHOT_DIR)
+
+    @property
+    def snapshot_mode(self):
+        return self.snapshot_reader is not None
+
+    @property
+    def index_version(self):
+        if self.snapshot_mode:
+            snapshot = self.snapshot_reader.current()
+            return snapshot.version if snapshot else None
+        return self.version
 
     def clean_text(self, text):
         text = re.sub(r'\s+', ' ', text)
         return text.strip()
 
     def hash_document(self, doc):
+        # 출처를 함께 해시해, 같은 내용이 여러 출처에 있어도 한 출처를 삭제할 때 다른 출처의 청크가 지워지지 않게 한다.
         cleaned_content = self.clean_text(doc.page_content)
-        return hashlib.md5(cleaned_content.encode()).hexdigest()
+        source = str(doc.metadata.get("source", ""))
+        return hashlib.md5(f"{source}\0{cleaned_content}".encode()).digest()
 
-    def add_documents(self, documents, is_law_related=False):
-        target_documents = self.law_documents if is_law_related else self.general_documents
+    def add_documents(self, documents, is_law_related=False, replace_source=None):
+        # replace_source가 주어지면 해당 출처의 기존 청크를 tombstone 처리한 뒤 새 리비전으로 추가한다.
+        if self.snapshot_mode:
+            return self.publish_documents(documents, is_law_related, replace_source)
+
+        with self._write_lock:
+            if replace_source is not None:
+                self._tombstone_source(replace_source)
+
+            target_documents = self.law_documents if is_law_related else self.general_documents
+            new_documents = []
+            ids = []
+
+            for doc in documents:
+                doc_hash = self.hash_document(doc)
+                if doc_hash not in self.document_hashes:
+                    doc.page_content = self.clean_text(doc.page_content)
+                    row = target_documents.append_document(doc, doc_hash)
+                    self.document_hashes.add(doc_hash)
+                    new_documents.append(target_documents.document(row))
+                    ids.append(doc_hash.hex())
+
+            if new_documents:
+                self.logger.info(f"Added {len(new_documents)} unique documents to the {'law' if is_law_related else 'general'} vector store.")
+                self._index_documents(is_law_related, new_documents, ids)
+            return len(new_documents)
+
+    def delete_source(self, source):
+        if self.snapshot_mode:
+            removed = self.snapshot_writer.delete_source(source)
+            self.snapshot_reader.invalidate()
+        else:
+            with self._write_lock:
+                removed = self._tombstone_source(source)
+        self.logger.info(f"Deleted {removed} documents of source {source}.")
+        return removed
+
+    def _tombstone_source(self, source):
+        removed = 0
+        for is_law_related in (False, True):
+            target_documents = self.law_documents if is_law_related else self.general_documents
+            hashes = target_documents.tombstone_source(source)
+            if not hashes:
+                continue
+            self.document_hashes.difference_update(hashes)
+            target_vector_store = self.law_vector_store if is_law_related else self.general_vector_store
+            if target_vector_store is not None:
+                target_vector_store.delete(ids=[doc_hash.hex() for doc_hash in hashes])
+            removed += len(hashes)
+        if removed:
+            self.version += 1
+        return removed
+
+    def compact_if_needed(self, min_ratio=None):
+        # tombstone 비율이 임계값을 넘은 파티션만 살아 있는 청크로 다시 쓴다.
+        min_ratio = settings.COMPACTION_TOMBSTONE_RATIO if min_ratio is None else min_ratio
+        for is_law_related in (False, True):
+            name = partition_name(is_law_related)
+            if self.snapshot_mode:
+                # 세그먼트만 합쳐진 경우에도 새 버전이 발행되므로 항상 다시 확인한다.
+                removed = self.snapshot_writer.compact(is_law_related, min_ratio)
+                self.snapshot_reader.invalidate()
+                if removed:
+                    self.logger.info(f"Compacted {name} index snapshot, dropped {removed} tombstones.")
+                continue
+
+            with self._write_lock:
+                target_documents = self.law_documents if is_law_related else self.general_documents
+                if target_documents.tombstones == 0 or target_documents.tombstone_ratio < min_ratio:
+                    continue
+                removed = target_documents.tombstones
+                # 행 번호가 바뀌므로 새 저장소를 만든 뒤 참조를 교체한다. Chroma에서는 이미 삭제되어 있다.
+                if is_law_related:
+                    self.law_documents = target_documents.compact()
+                else:
+                    self.general_documents = target_documents.compact()
+                self.logger.info(f"Compacted {name} document store, dropped {removed} tombstones.")
+
+    def add_document_batches(self, batches, is_law_related=False, replace_source=None):
+        # 큰 문서를 배치로 나눠 추가한다. 배치가 하나도 없으면 저장소를 바꾸지 않는다.
+        # 스냅샷 모드에서는 모든 배치를 하나의 세그먼트로 모아 한 번만 발행하므로, 배치를 만드는 중에 실패하면 아무것도 발행되지 않는다.
+        if not self.snapshot_mode:
+            added = 0
+            for documents in batches:
+                added += self.add_documents(documents, is_law_related, replace_source)
+                # 이전 리비전은 첫 배치에서 한 번만 교체한다.
+                replace_source = None
+            return added
+
+        extracted = 0
+        with self.snapshot_writer.pending(is_law_related, replace_source) as pending:
+            for documents in batches:
+                extracted += len(documents)
+                unique_documents, hashes = self._unique_documents(documents)
+                pending.add(unique_documents, hashes, self.embedding_model.embed_documents)
+            if not extracted:
+                return 0
+            added = pending.commit()
+        self.snapshot_reader.invalidate()
+        self.logger.info(f"Published {added} documents to the {'law' if is_law_related else 'general'} index snapshot.")
+        return added
+
+    def _unique_documents(self, documents):
         unique_documents = []
+        hashes = []
+        seen = set()
 
         for doc in documents:
             doc_hash = self.hash_document(doc)
-            if doc_hash not in self.document_hashes:
+            if doc_hash not in seen:
+                seen.add(doc_hash)
                 doc.page_content = self.clean_text(doc.page_content)
                 unique_documents.append(doc)
-                self.document_hashes.add(doc_hash)
+                hashes.append(doc_hash)
+        return unique_documents, hashes
 
-        if unique_documents:
-            target_documents.extend(unique_documents)
-            self.logger.info(f"Added {len(unique_documents)} unique documents to the {'law' if is_law_related else 'general'} vector store.")
+    def publish_documents(self, documents, is_law_related=False, replace_source=None):
+        unique_documents, hashes = self._unique_documents(documents)
+        if not unique_documents and replace_source is None:
+            return 0
+
+        added = self.snapshot_writer.publish(is_law_related, unique_documents, hashes, self.embedding_model.embed_documents, replace_source)
+        # 업로드를 처리한 워커는 다음 주기를 기다리지 않고 바로 새 버전을 본다.
+        self.snapshot_reader.invalidate()
+        self.logger.info(f"Published {added} documents to the {'law' if is_law_related else 'general'} index snapshot.")
+        return added
+
+    def embed_query(self, query):
+        return self.embedding_model.embed_query(query)
+
+    def search(self, query, is_law_related=False, k=4, query_vector=None):
+        # query_vector를 넘기면 질문 임베딩을 다시 계산하지 않는다.
+        if self.snapshot_mode:
+            snapshot = self.snapshot_reader.current()
+            partition = snapshot.partition(is_law_related) if snapshot else None
+            if partition is None or partition.live == 0:
+                return []
+            if query_vector is None:
+                query_vector = self.embed_query(query)
+            results = partition.search(query_vector, k, settings.VECTOR_QUANTIZATION, settings.RESCORE_FACTOR)
+            return [partition.document(row) for row, _ in results]
+
+        target_vector_store = self.law_vector_store if is_law_related else self.general_vector_store
+        if target_vector_store is None:
+            return []
+        if query_vector is not None:
+            return target_vector_store.similarity_search_by_vector(query_vector, k=k)
+        return target_vector_store.similarity_search(query, k=k)
+
+    def _pinned_documents(self, is_law_related, start=0, source=None, page=None):
+        # 한 버전(인메모리 모드에서는 한 저장소 객체)에 고정해 행 번호 세대와 (행 번호, Document) 생성기를 돌려준다.
+        # 필터에 맞지 않는 행은 본문을 읽지 않는다.
+        if self.snapshot_mode:
+            snapshot = self.snapshot_reader.current()
+            partition = snapshot.partition(is_law_related) if snapshot else None
+            if partition is None:
+                return 0, iter(())
+            rows = partition.iter_rows(start, source=source, page=page)
+            return partition.generation, ((row, partition.document(row)) for row in rows)
+
+        target_documents = self.law_documents if is_law_related else self.general_documents
+        source_id = target_documents.source_id(source) if source is not None else None
+        if source is not None and source_id is None:
+            return target_documents.generation, iter(())
+        rows = (row for row in range(start, len(target_documents)) if target_documents.matches(row, source_id=source_id, page=page))
+        return target_documents.generation, ((row, target_documents.document(row)) for row in rows)
+
+    def list_documents(self, is_law_related=False, start=0, limit=50, source=None, page=None, generation=None):
+        # 최대 limit개의 (행 번호, Document)와 다음 시작 행을 돌려준다.
+        # 행 번호는 압축 때만 바뀌므로, 커서의 세대가 현재와 다르면 건너뛰거나 중복될 수 있어 거절한다.
+        current, documents = self._pinned_documents(is_law_related, start, source, page)
+        if generation is not None and generation != current:
+            raise StaleCursorError(f"Cursor generation {generation} does not match the current generation {current}")
+
+        page_documents = []
+        next_row = None
+        for row, doc in documents:
+            if len(page_documents) == limit:
+                next_row = row
+                break
+            page_documents.append((row, doc))
+        return current, page_documents, next_row
+
+    def iter_documents(self, is_law_related=False, start=0, source=None, page=None):
+        # (행 번호, Document)를 순서대로 내보낸다.
+        yield from self._pinned_documents(is_law_related, start, source, page)[1]
+
+    def stats(self):
+        # 문서 본문을 읽지 않고 파티션별 개수와 살아 있는 청크의 텍스트 크기만 집계한다.
+        partitions = {}
+        snapshot = self.snapshot_reader.current() if self.snapshot_mode else None
+        for is_law_related in (False, True):
+            name = partition_name(is_law_related)
+            if self.snapshot_mode:
+                partition = snapshot.partition(is_law_related) if snapshot else None
+                partitions[name] = {
+                    "documents": partition.live if partition else 0,
+                    "tombstones": partition.tombstones if partition else 0,
+                    "bytes": partition.live_bytes if partition else 0,
+                    "segments": len(partition.segments) if partition else 0,
+                    "sources": len(partition.sources) if partition else 0,
+                }
+            else:
+                target_documents = self.law_documents if is_law_related else self.general_documents
+                partitions[name] = {
+                    "documents": target_documents.live_count,
+                    "tombstones": target_documents.tombstones,
+                    "bytes": target_documents.live_bytes,
+                    "sources": len(target_documents.sources),
+                }
+
+        return {
+            "index_version": snapshot.version if snapshot else (None if self.snapshot_mode else self.version),
+            "documents": sum(p["documents"] for p in partitions.values()),
+            "bytes": sum(p["bytes"] for p in partitions.values()),
+            "partitions": partitions,
+        }
+
+    def _index_documents(self, is_law_related, documents, ids):
+        # 기존 컬렉션에는 새 청크만 추가하고, 전체 재구성은 컬렉션이 없을 때만 한다.
+        target_vector_store = self.law_vector_store if is_law_related else self.general_vector_store
+        if target_vector_store is None:
             self.create_vector_store(is_law_related)
+            return
+        target_vector_store.add_documents(documents, ids=ids)
+        self.version += 1
 
     def create_vector_store(self, is_law_related=False):
         target_documents = self.law_documents if is_law_related else self.general_documents
+        target_vector_store = self.law_vector_store if is_law_related else self.general_vector_store
+        if target_vector_store is not None:
+            target_vector_store.delete_collection()
 
-        vector_store = Chroma.from_documents(documents=target_documents, embedding=self.embedding_model)
+        rows = [row for row in range(len(target_documents)) if target_documents.is_alive(row)]
+        vector_store = Chroma.from_documents(
+            documents=[target_documents.document(row) for row in rows],
+            embedding=self.embedding_model,
+            ids=[target_documents.hash(row).hex() for row in rows],
+            collection_name=f"{partition_name(is_law_related)}_documents",
+        )
 
         if is_law_related:
             self.law_vector_store = vector_store
         else:
             self.general_vector_store = vector_store
+        self.version += 1
 
-        self.logger.info(f"{'Law' if is_law_related else 'General'} vector store created with {len(target_documents)} documents.")
+        self.logger.info(f"{'Law' if is_law_related else 'General'} vector store created with {len(rows)} documents.")
 
     def as_retriever(self, is_law_related=False, k=8):
         target_vector_store = self.law_vector_store if is_law_related else self.general_vector_store
@@ -82,17 +337,12 @@ class VectorStore:
         self.logger.warning("Chroma does not support direct save/load operations like FAISS.")
 
     def clean_existing_documents(self):
-        self.document_hashes.clear()
-        for doc_list in [self.general_documents, self.law_documents]:
-            unique_docs = []
-            for doc in doc_list:
-                doc_hash = self.hash_document(doc)
-                if doc_hash not in self.document_hashes:
-                    doc.page_content = self.clean_text(doc.page_content)
-                    unique_docs.append(doc)
-                    self.document_hashes.add(doc_hash)
-            doc_list[:] = unique_docs
+        if self.snapshot_mode:
+            # 스냅샷 발행 시 이미 해시 기준으로 중복이 제거된다.
+            return
 
-        self.create_vector_store(is_law_related=False)
-        self.create_vector_store(is_law_related=True)
-        self.logger.info("Existing documents cleaned and vector stores recreated.")
\ No newline at end of file
+        # 문서는 추가 시점에 정제·중복 제거되므로, 해시 열로 중복 검사 집합만 다시 맞춘다.
+        with self._write_lock:
+            self.document_hashes = set(self.general_documents.hashes())
+            self.document_hashes.update(self.law_documents.hashes())
+        self.logger.info(f"Document hash index rebuilt with {len(self.document_hashes)} entries.")
@@ -0,0 +1,78 @@
+# 청크 저장 방식별 메모리 사용량 비교 (user-032)
+#
+#   python -m bench.document_store_memory --chunks 100000
+#
+# Document 객체 목록 + 16진수 해시 문자열 집합(이전 방식)과
+# DocumentStore + 16바이트 다이제스트 집합(현재 방식)을 같은 청크로 채우고,
+# tracemalloc으로 청크당 바이트 수를 잰다.
+import argparse
+import gc
+import hashlib
+import random
+import tracemalloc
+
+from langchain.schema import Document
+
+from app.services.document_store import DocumentStore
+
+SYLLABLES = "항만공사법규정조항선박입항출항화물하역시설사용료부과징수기준운영관리안전보안환경"
+
+
+def make_chunks(count, chunk_chars, sources, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) for _ in range(5000)]
+    words_per_chunk = chunk_chars // 4 + 1
+    for i in range(count):
+        yield " ".join(rng.choices(vocabulary, k=words_per_chunk))[:chunk_chars], f"source-{i % sources}.pdf", i % 40
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def build_documents(chunks):
+    documents, hashes = [], set()
+    for text, source, page in chunks:
+        documents.append(Document(page_content=text, metadata={"source": source, "page": page}))
+        hashes.add(hashlib.md5(text.encode()).hexdigest())
+    return documents, hashes
+
+
+def build_store(chunks):
+    store, hashes = DocumentStore(), set()
+    for text, source, page in chunks:
+        digest = hashlib.md5(f"{source}\0{text}".encode()).digest()
+        store.append(text, source, page, digest)
+        hashes.add(digest)
+    return store, hashes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--chunk-chars", type=int, default=230)
+    parser.add_argument("--sources", type=int, default=200)
+    args = parser.parse_args()
+
+    def chunks():
+        # 청크 문자열도 측정 구간 안에서 만들어, 저장 방식이 본문을 어떻게 보관하는지까지 포함한다.
+        return make_chunks(args.chunks, args.chunk_chars, args.sources)
+
+    text_bytes = sum(len(text.encode("utf-8")) for text, _, _ in chunks())
+    print(f"{args.chunks} chunks, {text_bytes / args.chunks:.0f} B of UTF-8 text per chunk")
+
+    _, documents_bytes = measure(lambda: build_documents(chunks()))
+    (store, _), store_bytes = measure(lambda: build_store(chunks()))
+    print(f"Document list + hex hash set : {documents_bytes / args.chunks:7.0f} B/chunk")
+    print(f"DocumentStore + digest set   : {store_bytes / args.chunks:7.0f} B/chunk "
+          f"(columns {store.memory_usage() / args.chunks:.0f} B/chunk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# 추출형 대체 답변의 지연 시간 측정 (user-029)
+#
+#   python -m bench.extractive_latency --docs 8 --chunk-chars 4000 --queries 500
+#
+# /chat이 검색하는 최대 청크 수(법률 4 + 일반 4)만큼 chunk_chars 길이의 합성 청크를 만들고,
+# 질문마다 ExtractiveAnswerer.answer()에 걸리는 시간의 p50 / p99 / 최댓값을 잰다.
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.services.extractive import ExtractiveAnswerer
+
+SYLLABLES = "항만공사법규정조항선박입항출항화물하역시설사용료부과징수기준운영관리안전보안환경"
+
+
+def make_docs(rng, vocabulary, count, chunk_chars):
+    docs = []
+    for i in range(count):
+        sentences = []
+        while sum(len(s) + 1 for s in sentences) < chunk_chars:
+            sentences.append(" ".join(rng.choices(vocabulary, k=rng.randint(6, 14))) + ".")
+        text = " ".join(sentences)[:chunk_chars]
+        docs.append(SimpleNamespace(page_content=text, metadata={"source": f"source-{i}.pdf", "page": i}))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--chunk-chars", type=int, default=4000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) for _ in range(5000)]
+    answerer = ExtractiveAnswerer()
+
+    timings = []
+    for _ in range(args.queries):
+        docs = make_docs(rng, vocabulary, args.docs, args.chunk_chars)
+        query = " ".join(rng.choices(vocabulary, k=rng.randint(3, 8)))
+        started = time.perf_counter()
+        answerer.answer(query, docs)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{args.docs} chunks x {args.chunk_chars} chars, {args.queries} queries")
+    print(f"p50 {statistics.median(timings):.2f} ms   p99 {p99:.2f} ms   max {timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# 양자화 방식별 recall@k, 1차 검색 메모리, 지연 시간 비교 (user-034)
+#
+#   python -m bench.quantization_recall --vectors 50000 --dim 1536 --queries 200
+#
+# 군집된 합성 벡터로 스냅샷을 발행한 뒤, float32 전수 검색 결과를 정답으로 두고
+# none / int8 / binary 1차 검색 + float32 재채점의 recall@k를 잰다.
+import argparse
+import hashlib
+import tempfile
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from app.services.index_snapshot import IndexSnapshotReader, IndexSnapshotWriter
+
+
+def clustered_vectors(rng, count, dim, clusters, noise):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    return (centers[rng.integers(0, clusters, count)] + noise * rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def first_pass_bytes(partition, mode):
+    if mode == "int8":
+        return sum(segment.int8_codes.nbytes for segment in partition.segments)
+    if mode == "binary":
+        return sum(segment.binary_codes.nbytes for segment in partition.segments)
+    return sum(segment.vectors.nbytes for segment in partition.segments)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[4, 10, 50])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    vectors = clustered_vectors(rng, args.vectors, args.dim, args.clusters, noise=0.9)
+    queries = vectors[rng.integers(0, args.vectors, args.queries)] + 0.5 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    documents = [Document(page_content=f"chunk {i}", metadata={"source": "bench.pdf", "page": 0}) for i in range(args.vectors)]
+    hashes = [hashlib.md5(f"bench.pdf\0chunk {i}".encode()).digest() for i in range(args.vectors)]
+
+    with tempfile.TemporaryDirectory() as root:
+        IndexSnapshotWriter(root).publish(False, documents, hashes, lambda texts: vectors)
+        snapshot = IndexSnapshotReader(root, refresh_interval=0).current()
+        partition = snapshot.partition(False)
+
+        truth = [{row for row, _ in partition.search(query, args.k)} for query in queries]
+        print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+        for mode in ("none", "int8", "binary"):
+            for factor in ((1,) if mode == "none" else args.rescore_factors):
+                started = time.perf_counter()
+                results = [{row for row, _ in partition.search(query, args.k, mode, factor)} for query in queries]
+                latency = (time.perf_counter() - started) / args.queries * 1000
+                recall = np.mean([len(result & expected) / args.k for result, expected in zip(results, truth)])
+                per_vector = first_pass_bytes(partition, mode) / args.vectors
+                print(f"{mode:6s} rescore x{factor:<3d} recall@{args.k}={recall:.3f} first pass {per_vector:6.0f} B/vec  {latency:6.1f} ms/query")
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+for module in ("langchain", "langchain_openai", "langchain_chroma", "langchain_community", "langdetect", "deep_translator"):
+    pytest.importorskip(module)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.llm_scheduler import LLMScheduler
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    # app.db.database는 import 시 MySQL에 연결하므로 테스트에서는 빈 세션으로 대체한다.
+    database = types.ModuleType("app.db.database")
+    database.SessionLocal = None
+    monkeypatch.setitem(sys.modules, "app.db.database", database)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    from app.api.v1.endpoints import chat
+
+    monkeypatch.setattr(chat, "detect", lambda text: "ko")
+    monkeypatch.setattr(chat.vector_store, "embed_query", lambda text: [1.0, 0.0])
+    monkeypatch.setattr(chat.intent_router, "match", lambda vector: None)
+    return chat
+
+
+@pytest.fixture
+def client(chat):
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api/v1")
+    return TestClient(app)
+
+
+def test_chat_returns_503_with_retry_after_when_queue_is_full(chat, client, monkeypatch):
+    scheduler = LLMScheduler(requests_per_minute=60, tokens_per_minute=1000, max_queue_size=0)
+    monkeypatch.setattr(chat, "llm_scheduler", scheduler)
+
+    response = client.post("/api/v1/chat", json={"message": "항만 시설 사용료는 얼마인가요?"})
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert scheduler.rejected == 1
+
+
+class FakeScheduler:
+    # 대기 없이 바로 주어진 예외를 던지는 스케줄러
+    def __init__(self, error):
+        self.error = error
+
+    def check_capacity(self):
+        pass
+
+    async def submit(self, fn, tokens=1, priority=0, timeout=None):
+        raise self.error
+
+
+@pytest.fixture
+def retrieved(chat, monkeypatch):
+    from langchain.schema import Document
+    from pydantic import SecretStr
+
+    docs = [Document(page_content="항만 시설 사용료는 톤당 100원입니다. 납부는 월말까지 합니다.", metadata={"source": "fees.pdf", "page": 0})]
+    monkeypatch.setattr(chat.vector_store, "search", lambda *args, **kwargs: list(docs))
+    monkeypatch.setattr(chat.settings, "OPENAI_API_KEY", SecretStr("test-key"))
+    return docs
+
+
+def test_chat_returns_503_when_submit_is_overloaded(chat, client, retrieved, monkeypatch):
+    from app.services.llm_scheduler import SchedulerOverloaded
+
+    monkeypatch.setattr(chat, "llm_scheduler", FakeScheduler(SchedulerOverloaded(7, "LLM provider rate limit exceeded")))
+
+    response = client.post("/api/v1/chat", json={"message": "항만 시설 사용료는 얼마인가요?"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_chat_degrades_when_queue_deadline_passes(chat, client, retrieved, monkeypatch):
+    from app.services.llm_scheduler import SchedulerDeadlineExceeded
+
+    monkeypatch.setattr(chat, "llm_scheduler", FakeScheduler(SchedulerDeadlineExceeded(1)))
+
+    response = client.post("/api/v1/chat", json={"message": "항만 시설 사용료는 얼마인가요?"})
+
+    assert response.status_code == 200
+    assert response.json()["degraded"] is True
+    assert response.json()["sources"]
+
+
+def test_chat_submits_with_token_based_priority(chat, client, retrieved, monkeypatch):
+    from app.services.llm_scheduler import SchedulerDeadlineExceeded
+
+    scheduler = FakeScheduler(SchedulerDeadlineExceeded(1))
+    submitted = []
+
+    async def submit(fn, tokens=1, priority=0, timeout=None):
+        submitted.append((tokens, priority))
+        raise scheduler.error
+
+    scheduler.submit = submit
+    monkeypatch.setattr(chat, "llm_scheduler", scheduler)
+
+    client.post("/api/v1/chat", json={"message": "항만 시설 사용료는 얼마인가요?"})
+
+    tokens, priority = submitted[0]
+    assert priority == chat.answer_priority(tokens) == tokens // chat.PRIORITY_TOKEN_STEP
+
+
+def test_chat_reads_index_version_off_the_event_loop(chat, client, retrieved, monkeypatch):
+    import asyncio
+
+    from app.services.llm_scheduler import SchedulerDeadlineExceeded
+
+    monkeypatch.setattr(chat, "llm_scheduler", FakeScheduler(SchedulerDeadlineExceeded(1)))
+    on_event_loop = []
+
+    def index_version(self):
+        # 스냅샷 모드의 버전 조회는 새 스냅샷을 열 수 있으므로 이벤트 루프 스레드에서 호출되면 안 된다.
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return "v00000001"
+
+    monkeypatch.setattr(type(chat.vector_store), "index_version", property(index_version))
+
+    assert client.post("/api/v1/chat", json={"message": "항만 시설 사용료는 얼마인가요?"}).status_code == 200
+    assert on_event_loop == [False]
@@ -0,0 +1,105 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.schema import Document
+
+from app.services.document_store import NO_PAGE, DocumentStore, page_of
+
+
+def digest(source, text):
+    return hashlib.md5(f"{source}\0{text}".encode()).digest()
+
+
+def fill(store, source, texts, page=0):
+    return [store.append(text, source, page, digest(source, text)) for text in texts]
+
+
+def test_append_stores_columns():
+    store = DocumentStore(is_law_related=True)
+    row = store.append("항만 시설 사용료", "fees.pdf", 2, digest("fees.pdf", "항만 시설 사용료"))
+
+    assert (len(store), store.live_count, store.tombstones) == (1, 1, 0)
+    assert store.text(row) == "항만 시설 사용료"
+    assert store.source(row) == "fees.pdf"
+    assert store.hash(row) == digest("fees.pdf", "항만 시설 사용료")
+    assert store.metadata(row) == {"source": "fees.pdf", "revision": 0, "is_law_related": True, "page": 2}
+    assert store.live_bytes == len("항만 시설 사용료".encode("utf-8"))
+
+
+@pytest.mark.parametrize("metadata, page", [
+    ({"page": 3}, 3),
+    ({"page": "4"}, 4),
+    ({"page_number": 3}, 2),
+    ({"page": 0, "page_number": 9}, 0),
+    ({}, NO_PAGE),
+])
+def test_page_normalisation(metadata, page):
+    assert page_of(metadata) == page
+
+    store = DocumentStore()
+    row = store.append_document(Document(page_content="본문", metadata={"source": "a.pdf", **metadata}), digest("a.pdf", "본문"))
+    assert store.document(row).metadata.get("page") == (None if page == NO_PAGE else page)
+
+
+def test_tombstone_source_marks_only_that_source():
+    store = DocumentStore()
+    fill(store, "a.pdf", ["a1", "a2"])
+    fill(store, "b.pdf", ["b1"])
+
+    removed = store.tombstone_source("a.pdf")
+
+    assert removed == [digest("a.pdf", "a1"), digest("a.pdf", "a2")]
+    assert (len(store), store.live_count, store.tombstones) == (3, 1, 2)
+    assert store.tombstone_ratio == pytest.approx(2 / 3)
+    assert store.live_bytes == len(b"b1")
+    assert [store.is_alive(row) for row in range(3)] == [False, False, True]
+    assert list(store.hashes()) == [digest("b.pdf", "b1")]
+    # 같은 출처를 다시 지워도 아무것도 바뀌지 않고, 없는 출처는 빈 목록을 돌려준다.
+    assert store.tombstone_source("a.pdf") == []
+    assert store.tombstone_source("missing.pdf") == []
+
+
+def test_reuploaded_source_gets_a_new_revision():
+    store = DocumentStore()
+    fill(store, "a.pdf", ["v1"])
+    store.tombstone_source("a.pdf")
+    row = fill(store, "a.pdf", ["v2"])[0]
+
+    assert store.metadata(row)["revision"] == 1
+
+
+def test_compact_drops_tombstones_and_bumps_generation():
+    store = DocumentStore()
+    fill(store, "a.pdf", ["a1", "a2"])
+    fill(store, "b.pdf", ["b1", "b2"], page=5)
+    store.tombstone_source("a.pdf")
+
+    compacted = store.compact()
+
+    assert (len(compacted), compacted.tombstones, compacted.generation) == (2, 0, store.generation + 1)
+    assert [compacted.text(row) for row in range(2)] == ["b1", "b2"]
+    assert [compacted.metadata(row)["page"] for row in range(2)] == [5, 5]
+    assert compacted.live_bytes == store.live_bytes
+    # 삭제된 출처의 리비전은 압축 뒤에도 유지되어, 다시 올린 문서가 이전 리비전과 구분된다.
+    row = compacted.append("a3", "a.pdf", 0, digest("a.pdf", "a3"))
+    assert compacted.metadata(row)["revision"] == 1
+    assert store.compact().compact().generation == store.generation + 2
+
+
+def test_matches_filters_by_source_page_and_liveness():
+    store = DocumentStore()
+    fill(store, "a.pdf", ["a1"], page=0)
+    fill(store, "a.pdf", ["a2"], page=1)
+    fill(store, "b.pdf", ["b1"], page=1)
+    fill(store, "c.pdf", ["c1"], page=1)
+    store.tombstone_source("c.pdf")
+    a = store.source_id("a.pdf")
+
+    assert [row for row in range(len(store)) if store.matches(row)] == [0, 1, 2]
+    assert [row for row in range(len(store)) if store.matches(row, source_id=a)] == [0, 1]
+    assert [row for row in range(len(store)) if store.matches(row, page=1)] == [1, 2]
+    assert [row for row in range(len(store)) if store.matches(row, source_id=a, page=1)] == [1]
+    assert store.source_id("missing.pdf") is None
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+from app.services.extractive import ExtractiveAnswerer
+
+
+def doc(text, **metadata):
+    return SimpleNamespace(page_content=text, metadata=metadata)
+
+
+def test_selects_overlapping_sentences_in_document_order():
+    docs = [
+        doc("선박 입항 신고는 24시간 전에 해야 합니다. 화물 하역은 부두별로 진행됩니다. 입항료는 톤당 부과됩니다.", source="a.pdf", page=2),
+        doc("항만 시설 사용료는 월말에 납부합니다. 선박 입항 시 도선사가 배정됩니다.", source="b.pdf", page=0),
+    ]
+    answerer = ExtractiveAnswerer(max_sentences=2)
+
+    result = answerer.answer("선박 입항 신고 기한", docs)
+
+    # 가장 많이 겹치는 두 문장을 고르고, 검색 순위와 문장 위치 순서로 다시 정렬한다.
+    assert result["answer"].split("\n\n") == [
+        "선박 입항 신고는 24시간 전에 해야 합니다. (출처: a.pdf p.3)",
+        "선박 입항 시 도선사가 배정됩니다. (출처: b.pdf p.1)",
+    ]
+    assert result["sources"] == [{"source": "a.pdf", "page": 3}, {"source": "b.pdf", "page": 1}]
+
+
+def test_higher_ranked_chunk_wins_ties():
+    # 겹치는 bigram 수와 문장 길이가 같으면 검색 순위가 높은 청크의 문장을 고른다.
+    docs = [doc("보안 구역 출입 승인 안내 나.", source="first.pdf", page=0), doc("보안 구역 출입 승인 안내 가.", source="second.pdf", page=0)]
+
+    result = ExtractiveAnswerer(max_sentences=1).answer("보안 구역 출입 승인", docs)
+
+    assert result["sources"] == [{"source": "first.pdf", "page": 1}]
+
+
+def test_falls_back_to_leading_sentences_of_top_chunk():
+    docs = [
+        doc("첫 번째 안내 문장입니다. 두 번째 안내 문장입니다. 세 번째 안내 문장입니다. 네 번째 안내 문장입니다.", source="top.pdf", page=4),
+        doc("전혀 관련 없는 다른 청크의 문장입니다.", source="other.pdf", page=0),
+    ]
+
+    result = ExtractiveAnswerer(max_sentences=3).answer("xyz", docs)
+
+    assert result["answer"].split("\n\n") == [
+        "첫 번째 안내 문장입니다. (출처: top.pdf p.5)",
+        "두 번째 안내 문장입니다. (출처: top.pdf p.5)",
+        "세 번째 안내 문장입니다. (출처: top.pdf p.5)",
+    ]
+    assert result["sources"] == [{"source": "top.pdf", "page": 5}]
+
+
+def test_page_metadata_maps_to_one_based_pages():
+    answerer = ExtractiveAnswerer()
+
+    # PyPDFLoader의 "page"는 0부터, "page_number"는 1부터 시작한다.
+    assert answerer.page_number({"page": 0}) == 1
+    assert answerer.page_number({"page": "6"}) == 7
+    assert answerer.page_number({"page_number": 3}) == 3
+    assert answerer.page_number({"page_number": 3, "page": 0}) == 3
+    assert answerer.page_number({}) is None
+
+
+def test_missing_page_is_omitted_from_citation():
+    result = ExtractiveAnswerer().answer("주차장 위치", [doc("방문객 주차장은 정문 옆에 있습니다.", source="faq.hwpx")])
+
+    assert result["answer"] == "방문객 주차장은 정문 옆에 있습니다. (출처: faq.hwpx)"
+    assert result["sources"] == [{"source": "faq.hwpx", "page": None}]
+
+
+def test_short_fragments_and_duplicates_are_skipped():
+    text = "짧음. 선박 입항 신고는 24시간 전에 해야 합니다."
+    docs = [doc(text, source="a.pdf", page=0), doc(text, source="b.pdf", page=0)]
+
+    result = ExtractiveAnswerer().answer("선박 입항 신고", docs)
+
+    assert result["answer"] == "선박 입항 신고는 24시간 전에 해야 합니다. (출처: a.pdf p.1)"
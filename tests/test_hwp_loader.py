@@ -0,0 +1,211 @@
+import io
+import struct
+import types
+import zipfile
+import zlib
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from app.services import hwp_loader
+from app.services.hwp_loader import HWPDependencyError, HWPFormatError, HWPLoader, HWPTAG_PARA_TEXT, MAX_RECORD_SIZE, OLE_SIGNATURE
+
+HWPX_NS = 'xmlns:hs="http://www.hancom.co.kr/hwpml/2011/section" xmlns:hp="http://www.hancom.co.kr/hwpml/2011/paragraph"'
+
+
+def record(tag, payload):
+    # 크기가 0xFFF 이상이면 헤더 뒤에 4바이트 확장 크기를 붙인다.
+    if len(payload) >= 0xFFF:
+        return struct.pack("<II", tag | (0xFFF << 20), len(payload)) + payload
+    return struct.pack("<I", tag | (len(payload) << 20)) + payload
+
+
+def para_text(*parts):
+    # 문자열은 UTF-16LE 글자로, 정수는 제어 문자로 넣는다. 8글자 제어 문자는 나머지 7글자를 0으로 채운다.
+    out = b""
+    for part in parts:
+        if isinstance(part, str):
+            out += part.encode("utf-16-le")
+        elif part in hwp_loader.CHAR_CONTROLS:
+            out += struct.pack("<H", part)
+        else:
+            out += struct.pack("<8H", part, 0, 0, 0, 0, 0, 0, part)
+    return out
+
+
+def deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def write_hwpx(tmp_path, sections, name="doc.hwpx"):
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w") as archive:
+        for index, body in enumerate(sections):
+            archive.writestr(f"Contents/section{index}.xml", f"<hs:sec {HWPX_NS}>{body}</hs:sec>")
+    return str(path)
+
+
+def test_record_headers_with_extended_size():
+    loader = HWPLoader()
+    small = b"a" * 10
+    large = b"b" * 5000
+    data = record(HWPTAG_PARA_TEXT, small) + record(0x42, large) + record(HWPTAG_PARA_TEXT, b"")
+
+    records = list(loader._iter_hwp_records(io.BytesIO(data), compressed=False))
+
+    assert records == [(HWPTAG_PARA_TEXT, small), (0x42, large), (HWPTAG_PARA_TEXT, b"")]
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_records_spanning_read_chunks(compressed):
+    # READ_SIZE 경계에 걸친 레코드도 온전히 꺼낸다.
+    loader = HWPLoader()
+    payloads = [f"문단 {i} ".encode("utf-16-le") * (i % 50 + 1) for i in range(2000)]
+    data = b"".join(record(HWPTAG_PARA_TEXT, payload) for payload in payloads)
+    assert len(data) > 3 * hwp_loader.READ_SIZE
+
+    stream = io.BytesIO(deflate(data) if compressed else data)
+    records = list(loader._iter_hwp_records(stream, compressed))
+
+    assert [payload for _, payload in records] == payloads
+
+
+def test_oversized_record_is_rejected():
+    loader = HWPLoader()
+    header = struct.pack("<II", HWPTAG_PARA_TEXT | (0xFFF << 20), MAX_RECORD_SIZE + 1)
+
+    with pytest.raises(HWPFormatError):
+        list(loader._iter_hwp_records(io.BytesIO(header + b"\0" * 100), compressed=False))
+
+
+def test_control_character_widths():
+    loader = HWPLoader()
+    payload = para_text("제1조", 9, "목적", 11, "본문", 24, "끝", 10, "다음", 13)
+
+    # 탭(8글자)은 공백, 표 등 확장 컨트롤(8글자)은 제거, 하이픈(1글자)은 "-", 줄바꿈(1글자)은 공백이 된다.
+    assert loader._decode_para_text(payload) == "제1조 목적본문-끝 다음"
+
+
+class FakeOleFile:
+    def __init__(self, streams):
+        self.streams = streams
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def listdir(self):
+        return [entry.split("/") for entry in self.streams if entry.startswith("BodyText/")]
+
+    def openstream(self, entry):
+        key = entry if isinstance(entry, str) else "/".join(entry)
+        if key not in self.streams:
+            raise OSError(f"stream {key} not found")
+        return io.BytesIO(self.streams[key])
+
+
+def fake_olefile(monkeypatch, streams):
+    module = types.SimpleNamespace(OleFileIO=lambda path: FakeOleFile(streams))
+    monkeypatch.setattr(hwp_loader, "olefile", module)
+
+
+def file_header(flags):
+    return b"HWP Document File".ljust(32, b"\0") + struct.pack("<II", 0x05000000, flags) + b"\0" * 212
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_hwp_sections_become_pages(tmp_path, monkeypatch, compressed):
+    sections = {
+        "BodyText/Section1": record(HWPTAG_PARA_TEXT, para_text("둘째 구역", 13)),
+        "BodyText/Section0": record(0x42, b"\0" * 8) + record(HWPTAG_PARA_TEXT, para_text("첫 구역", 13)),
+    }
+    streams = {name: deflate(data) if compressed else data for name, data in sections.items()}
+    streams["FileHeader"] = file_header(0x1 if compressed else 0)
+    fake_olefile(monkeypatch, streams)
+    path = tmp_path / "doc.hwp"
+    path.write_bytes(OLE_SIGNATURE)
+
+    documents = HWPLoader().load_and_split(str(path), source="doc.hwp")
+
+    assert [(doc.page_content, doc.metadata) for doc in documents] == [
+        ("첫 구역", {"source": "doc.hwp", "page": 0}),
+        ("둘째 구역", {"source": "doc.hwp", "page": 1}),
+    ]
+
+
+@pytest.mark.parametrize("flags", [0x2, 0x4])
+def test_encrypted_and_distribution_files_are_rejected(tmp_path, monkeypatch, flags):
+    fake_olefile(monkeypatch, {"FileHeader": file_header(flags)})
+    path = tmp_path / "doc.hwp"
+    path.write_bytes(OLE_SIGNATURE)
+
+    with pytest.raises(HWPFormatError):
+        HWPLoader().load_and_split(str(path))
+
+
+def test_corrupt_compressed_section_is_a_format_error(tmp_path, monkeypatch):
+    fake_olefile(monkeypatch, {"FileHeader": file_header(0x1), "BodyText/Section0": b"not deflate data"})
+    path = tmp_path / "doc.hwp"
+    path.write_bytes(OLE_SIGNATURE)
+
+    with pytest.raises(HWPFormatError):
+        HWPLoader().load_and_split(str(path))
+
+
+def test_missing_olefile_is_a_dependency_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(hwp_loader, "olefile", None)
+    path = tmp_path / "doc.hwp"
+    path.write_bytes(OLE_SIGNATURE)
+
+    with pytest.raises(HWPDependencyError):
+        HWPLoader().load_and_split(str(path))
+
+
+def test_hwpx_nested_table_paragraphs(tmp_path):
+    table = "<hp:tbl><hp:tr><hp:tc><hp:subList><hp:p><hp:run><hp:t>셀<hp:tab/>내용</hp:t></hp:run></hp:p></hp:subList></hp:tc></hp:tr></hp:tbl>"
+    body = (
+        f"<hp:p><hp:run><hp:t>표 앞</hp:t>{table}<hp:t> 표 뒤</hp:t></hp:run></hp:p>"
+        "<hp:p><hp:run><hp:t>둘째<hp:lineBreak/>줄</hp:t></hp:run></hp:p>"
+    )
+    path = write_hwpx(tmp_path, [body])
+
+    # 표 안의 문단은 바깥 문단보다 먼저 끝나므로 먼저 나오고, 바깥 문단에는 섞이지 않는다.
+    assert list(HWPLoader().hwpx_paragraphs(path)) == [(0, "셀 내용"), (0, "표 앞 표 뒤"), (0, "둘째 줄")]
+
+
+def test_hwpx_chunks_split_by_section_and_size(tmp_path):
+    paragraphs = "".join(f"<hp:p><hp:run><hp:t>문단{i}</hp:t></hp:run></hp:p>" for i in range(4))
+    path = write_hwpx(tmp_path, [paragraphs, "<hp:p><hp:run><hp:t>다음 구역</hp:t></hp:run></hp:p>"])
+
+    documents = HWPLoader(chunk_size=8).load_and_split(path, source="doc.hwpx")
+
+    assert [(doc.page_content, doc.metadata["page"]) for doc in documents] == [
+        ("문단0 문단1", 0), ("문단2 문단3", 0), ("다음 구역", 1),
+    ]
+
+
+def test_corrupt_zip_is_a_format_error(tmp_path):
+    path = tmp_path / "doc.hwpx"
+    path.write_bytes(b"PK\x03\x04 truncated archive")
+
+    with pytest.raises(HWPFormatError):
+        HWPLoader().load_and_split(str(path))
+
+
+def test_corrupt_xml_is_a_format_error(tmp_path):
+    path = write_hwpx(tmp_path, ["<hp:p><hp:run><hp:t>닫히지 않은 문단"])
+
+    with pytest.raises(HWPFormatError):
+        HWPLoader().load_and_split(path)
+
+
+def test_unknown_signature_is_a_format_error(tmp_path):
+    path = tmp_path / "doc.hwp"
+    path.write_bytes(b"%PDF-1.7")
+
+    with pytest.raises(HWPFormatError):
+        HWPLoader().load_and_split(str(path))
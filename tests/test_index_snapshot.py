@@ -0,0 +1,192 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.schema import Document
+
+from app.services.index_snapshot import IndexSnapshotReader, IndexSnapshotWriter
+
+
+class CountingEmbeddings:
+    # 본문 해시로 결정되는 임베딩. 호출된 문장 수를 센다.
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, texts):
+        self.embedded += len(texts)
+        return [np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16)).normal(size=32) for text in texts]
+
+
+def chunks(source, n, tag=""):
+    return [Document(page_content=f"{source} chunk {i} {tag}", metadata={"source": source, "page": i}) for i in range(n)]
+
+
+def digests(docs):
+    return [hashlib.md5(f"{doc.metadata['source']}\0{doc.page_content}".encode()).digest() for doc in docs]
+
+
+@pytest.fixture
+def index(tmp_path):
+    writer = IndexSnapshotWriter(str(tmp_path), keep_versions=100)
+    reader = IndexSnapshotReader(str(tmp_path), refresh_interval=0)
+    embed = CountingEmbeddings()
+
+    def publish(docs, replace_source=None):
+        return writer.publish(False, docs, digests(docs), embed, replace_source)
+
+    return tmp_path, writer, reader, embed, publish
+
+
+def segment_file(root, version, segment, file_name):
+    return os.path.join(root, version, f"general.{segment}.{file_name}")
+
+
+def test_append_writes_only_a_new_segment(index):
+    root, writer, reader, embed, publish = index
+    for i in range(3):
+        publish(chunks(f"s{i}.pdf", 4))
+
+    snapshot = reader.current()
+    partition = snapshot.partition(False)
+    assert (partition.count, partition.live) == (12, 12)
+    assert [segment.id for segment in partition.segments] == ["s00000001", "s00000002", "s00000003"]
+    # 이전 버전의 세그먼트 파일은 복사되지 않고 하드링크된다.
+    for file_name in ("vectors.npy", "texts.bin", "int8_codes.npy", "alive.npy"):
+        first = os.stat(segment_file(root, "v00000001", "s00000001", file_name))
+        last = os.stat(segment_file(root, "v00000003", "s00000001", file_name))
+        assert first.st_ino == last.st_ino
+
+
+def test_duplicates_are_not_embedded_again(index):
+    _, _, reader, embed, publish = index
+    docs = chunks("a.pdf", 5)
+    assert publish(docs) == 5
+    assert publish(docs) == 0
+    assert embed.embedded == 5
+    assert reader.current().version == "v00000001"
+
+
+def test_delete_rewrites_only_the_alive_file(index):
+    root, writer, reader, _, publish = index
+    publish(chunks("a.pdf", 3))
+    publish(chunks("b.pdf", 3))
+
+    assert writer.delete_source("a.pdf") == 3
+    partition = reader.current().partition(False)
+    assert [segment.live for segment in partition.segments] == [0, 3]
+    assert partition.live == 3
+    old_alive = os.stat(segment_file(root, "v00000002", "s00000001", "alive.npy"))
+    new_alive = os.stat(segment_file(root, "v00000003", "s00000001", "alive.npy"))
+    assert old_alive.st_ino != new_alive.st_ino
+    old_vectors = os.stat(segment_file(root, "v00000002", "s00000001", "vectors.npy"))
+    new_vectors = os.stat(segment_file(root, "v00000003", "s00000001", "vectors.npy"))
+    assert old_vectors.st_ino == new_vectors.st_ino
+
+
+def test_replace_tombstones_old_revision(index):
+    _, _, reader, _, publish = index
+    publish(chunks("a.pdf", 3))
+    assert publish(chunks("a.pdf", 2, "v2"), replace_source="a.pdf") == 2
+
+    partition = reader.current().partition(False)
+    documents = [partition.document(row) for row in partition.iter_rows()]
+    assert [doc.page_content for doc in documents] == ["a.pdf chunk 0 v2", "a.pdf chunk 1 v2"]
+    assert {doc.metadata["revision"] for doc in documents} == {1}
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8", "binary"])
+def test_search_merges_segments(index, quantization):
+    _, writer, reader, embed, publish = index
+    for i in range(4):
+        publish(chunks(f"s{i}.pdf", 8))
+    writer.delete_source("s1.pdf")
+
+    partition = reader.current().partition(False)
+    query = embed(["s2.pdf chunk 3 "])[0]
+    results = partition.search(query, 5, quantization, rescore_factor=8)
+    assert partition.document(results[0][0]).page_content == "s2.pdf chunk 3 "
+    assert len(results) == 5
+    assert all(partition.document(row).metadata["source"] != "s1.pdf" for row, _ in results)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_compaction_merges_segments_and_bumps_generation(index):
+    _, writer, reader, _, publish = index
+    for i in range(4):
+        publish(chunks(f"s{i}.pdf", 2))
+    writer.delete_source("s0.pdf")
+    writer.max_segments = 2
+
+    assert writer.compact(False, min_ratio=0.9) == 2
+    partition = reader.current().partition(False)
+    assert len(partition.segments) == 1
+    assert (partition.count, partition.live, partition.generation) == (6, 6, 1)
+    assert [partition.document(row).metadata["source"] for row in range(partition.count)] == ["s1.pdf"] * 2 + ["s2.pdf"] * 2 + ["s3.pdf"] * 2
+
+
+def test_iter_rows_filters_and_resumes(index):
+    _, _, reader, _, publish = index
+    publish(chunks("a.pdf", 3))
+    publish(chunks("b.pdf", 3))
+
+    partition = reader.current().partition(False)
+    assert list(partition.iter_rows(source="b.pdf")) == [3, 4, 5]
+    assert list(partition.iter_rows(start=2)) == [2, 3, 4, 5]
+    assert list(partition.iter_rows(page=1)) == [1, 4]
+    assert list(partition.iter_rows(source="missing.pdf")) == []
+
+
+def test_pending_segment_publishes_batches_as_one_version(index):
+    root, writer, reader, embed, publish = index
+    publish(chunks("a.pdf", 3))
+
+    docs = chunks("a.pdf", 10, "v2")
+    with writer.pending(False, replace_source="a.pdf") as pending:
+        for start in range(0, len(docs), 4):
+            batch = docs[start:start + 4]
+            pending.add(batch, digests(batch), embed)
+        # commit 전에는 새 버전이 생기지 않는다.
+        assert reader.current().version == "v00000001"
+        assert pending.commit() == 10
+
+    partition = reader.current().partition(False)
+    assert reader.current().version == "v00000002"
+    assert [segment.id for segment in partition.segments] == ["s00000001", "s00000002"]
+    assert [partition.document(row).page_content for row in partition.iter_rows()] == [doc.page_content for doc in docs]
+    assert not [entry for entry in os.listdir(root) if entry.startswith(".pending-")]
+
+
+def test_pending_segment_discarded_on_failure(index):
+    root, writer, reader, embed, publish = index
+    publish(chunks("a.pdf", 3))
+
+    with pytest.raises(ValueError):
+        with writer.pending(False, replace_source="a.pdf") as pending:
+            batch = chunks("a.pdf", 2, "v2")
+            pending.add(batch, digests(batch), embed)
+            raise ValueError("corrupt file")
+
+    partition = reader.current().partition(False)
+    assert reader.current().version == "v00000001"
+    assert partition.live == 3
+    assert not [entry for entry in os.listdir(root) if entry.startswith(".pending-")]
+
+
+def test_pending_segment_quantization_matches_whole_array(index, monkeypatch):
+    from app.services import index_snapshot
+
+    _, _, reader, embed, publish = index
+    # 블록 경계를 여러 번 넘도록 블록 크기를 줄인다.
+    monkeypatch.setattr(index_snapshot, "SCAN_BLOCK_ROWS", 3)
+    publish(chunks("a.pdf", 10))
+
+    segment = reader.current().partition(False).segments[0]
+    vectors = np.asarray(segment.vectors)
+    codes, scales = index_snapshot.quantize_int8(vectors)
+    assert np.array_equal(np.asarray(segment.int8_codes), codes)
+    assert np.array_equal(np.asarray(segment.int8_scales), scales)
+    assert np.array_equal(np.asarray(segment.binary_codes), index_snapshot.quantize_binary(vectors))
@@ -0,0 +1,113 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.intent_router import IntentRouter
+
+
+class FakeEmbeddings:
+    # 미리 정한 문장은 정해진 벡터로, 나머지는 그 문장들과 직교하는 벡터로 임베딩한다. 호출된 문장을 기록한다.
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.embedded = []
+        self.gate = None
+
+    def embed_documents(self, texts):
+        if self.gate is not None:
+            self.gate.wait()
+        self.embedded.extend(texts)
+        return [self.vectors.get(text, [0.0, 0.0, 1.0]) for text in texts]
+
+
+def row(button_name, response_text, link=None):
+    return SimpleNamespace(button_name=button_name, response_text=response_text, link=link)
+
+
+@pytest.fixture
+def table():
+    return [row("운영 시간", "평일 9시부터 18시까지 운영합니다.", "/hours"), row("주차 안내", "방문객 주차장은 정문 옆에 있습니다.")]
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings({
+        "운영 시간": [1.0, 0.0, 0.0],
+        "평일 9시부터 18시까지 운영합니다.": [0.9, 0.1, 0.0],
+        "주차 안내": [0.0, 1.0, 0.0],
+        "방문객 주차장은 정문 옆에 있습니다.": [0.1, 0.9, 0.0],
+    })
+
+
+def loaded_router(embeddings, table):
+    router = IntentRouter(embeddings, threshold=0.9, fetch_rows=lambda: table)
+    router.load()
+    # 테스트에서는 백그라운드 갱신을 띄우지 않는다.
+    router._next_load = float("inf")
+    return router
+
+
+def test_match_above_threshold(embeddings, table):
+    router = loaded_router(embeddings, table)
+
+    intent = router.match([0.99, 0.05, 0.0])
+
+    assert intent["button_name"] == "운영 시간"
+    assert intent["link"] == "/hours"
+    assert intent["score"] >= 0.9
+
+
+def test_miss_below_threshold(embeddings, table):
+    router = loaded_router(embeddings, table)
+
+    assert router.match([0.6, 0.6, 0.5]) is None
+
+
+def test_empty_table_never_matches(embeddings):
+    router = loaded_router(embeddings, [])
+
+    assert router.match([1.0, 0.0, 0.0]) is None
+    assert embeddings.embedded == []
+
+
+def test_reload_embeds_only_new_or_changed_text(embeddings, table):
+    router = loaded_router(embeddings, table)
+    assert len(embeddings.embedded) == 4
+
+    table[1] = row("주차 안내", "주차장은 정문 오른쪽으로 옮겼습니다.")
+    table.append(row("운영 시간", "평일 9시부터 18시까지 운영합니다."))
+    assert router.load() == 1
+
+    assert embeddings.embedded[4:] == ["주차장은 정문 오른쪽으로 옮겼습니다."]
+    assert router._index[1].shape == (6, 3)
+    # 표에서 사라진 문장의 임베딩은 버린다.
+    assert len(router._embeddings) == 4
+
+
+def test_failed_load_keeps_previous_matrix(embeddings, table):
+    router = loaded_router(embeddings, table)
+
+    def broken():
+        raise RuntimeError("database is down")
+
+    router.fetch_rows = broken
+    router.refresh()
+
+    assert router.match([1.0, 0.0, 0.0])["button_name"] == "운영 시간"
+
+
+def test_refresh_runs_off_the_request_path(embeddings, table):
+    router = loaded_router(embeddings, table)
+    table[0] = row("운영 시간 변경", "주말에도 운영합니다.")
+    embeddings.gate = threading.Event()
+    router._next_load = 0.0
+
+    # 갱신이 임베딩 호출에서 멈춰 있어도 질문은 이전 행렬로 바로 처리된다.
+    assert router.match([1.0, 0.0, 0.0])["button_name"] == "운영 시간"
+    assert router.match([1.0, 0.0, 0.0])["button_name"] == "운영 시간"
+
+    embeddings.gate.set()
+    router._refresh_thread.join(timeout=5)
+    assert router.match([0.0, 1.0, 0.0])["button_name"] == "주차 안내"
+    assert router.match([1.0, 0.0, 0.0]) is None
@@ -0,0 +1,237 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, SchedulerDeadlineExceeded, SchedulerOverloaded, TokenBucket
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FakeLLM:
+    # 호출 순서와 시각을 기록하는 가짜 LLM 서버. gate가 주어지면 열릴 때까지 응답하지 않는다.
+    def __init__(self, gate=None, failures=0):
+        self.gate = gate
+        self.failures = failures
+        self.calls = []
+        self.started = []
+
+    def request(self, name):
+        async def call():
+            self.started.append((name, time.monotonic()))
+            if self.gate is not None:
+                await self.gate.wait()
+            if self.failures:
+                self.failures -= 1
+                raise RateLimitError("rate limited")
+            self.calls.append(name)
+            return name
+        return call
+
+
+def make_scheduler(**kwargs):
+    options = {"requests_per_minute": 6000, "tokens_per_minute": 600000, "max_queue_size": 100, "max_concurrency": 16}
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+def test_token_bucket_delay_and_refill():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.delay(1) == 0.0
+    bucket.consume(60)
+    assert bucket.delay(1) == pytest.approx(1.0, abs=0.05)
+    # 용량보다 큰 요청은 용량만큼만 기다린다.
+    assert bucket.delay(600) == pytest.approx(60.0, abs=0.1)
+
+
+def test_requests_per_minute_pacing():
+    async def scenario():
+        # 분당 1200건 = 초당 20건, 버킷을 비운 상태에서 6건은 약 0.3초에 걸쳐 나간다.
+        scheduler = make_scheduler(requests_per_minute=1200)
+        scheduler.requests.tokens = 0
+        llm = FakeLLM()
+        started = time.monotonic()
+        results = await asyncio.gather(*(scheduler.submit(llm.request(i)) for i in range(6)))
+        elapsed = time.monotonic() - started
+
+        assert results == list(range(6))
+        assert 0.25 <= elapsed < 1.0
+        gaps = [b - a for (_, a), (_, b) in zip(llm.started, llm.started[1:])]
+        assert min(gaps) >= 0.04
+
+    asyncio.run(scenario())
+
+
+def test_tokens_per_minute_pacing():
+    async def scenario():
+        # 분당 6000토큰 = 초당 100토큰, 요청당 20토큰이면 0.2초에 한 건씩 나간다.
+        scheduler = make_scheduler(tokens_per_minute=6000)
+        scheduler.tokens.tokens = 0
+        llm = FakeLLM()
+        started = time.monotonic()
+        await asyncio.gather(*(scheduler.submit(llm.request(i), tokens=20) for i in range(3)))
+        elapsed = time.monotonic() - started
+
+        assert 0.5 <= elapsed < 1.5
+        assert scheduler.completed == 3
+
+    asyncio.run(scenario())
+
+
+def test_throughput_without_limits_is_not_serialized():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=8)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return True
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(scheduler.submit(slow) for _ in range(32)))
+        elapsed = time.monotonic() - started
+
+        assert all(results)
+        # 8개씩 동시에 처리되므로 4라운드(약 0.2초)면 끝난다.
+        assert elapsed < 0.6
+
+    asyncio.run(scenario())
+
+
+def test_priority_order():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1)
+        gate = asyncio.Event()
+        llm = FakeLLM(gate=gate)
+
+        blocker = asyncio.ensure_future(scheduler.submit(llm.request("blocker")))
+        await asyncio.sleep(0.01)
+        tasks = [
+            asyncio.ensure_future(scheduler.submit(llm.request(name), priority=priority))
+            for name, priority in (("low-1", 5), ("high", 0), ("low-2", 5), ("medium", 1))
+        ]
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        # 우선순위가 같으면 먼저 들어온 순서대로 처리된다.
+        assert llm.calls == ["blocker", "high", "medium", "low-1", "low-2"]
+
+    asyncio.run(scenario())
+
+
+def test_queue_deadline_expires_while_slots_are_busy():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1)
+        gate = asyncio.Event()
+        llm = FakeLLM(gate=gate)
+
+        blocker = asyncio.ensure_future(scheduler.submit(llm.request("blocker")))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        with pytest.raises(SchedulerDeadlineExceeded) as excinfo:
+            await scheduler.submit(llm.request("late"), timeout=0.05)
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.5
+        assert excinfo.value.retry_after >= 1
+        assert scheduler.expired == 1
+        assert scheduler.queue_depth == 0
+
+        gate.set()
+        await blocker
+        assert llm.calls == ["blocker"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_callers_leave_the_queue():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1, max_queue_size=3)
+        gate = asyncio.Event()
+        llm = FakeLLM(gate=gate)
+
+        blocker = asyncio.ensure_future(scheduler.submit(llm.request("blocker")))
+        await asyncio.sleep(0.01)
+        # 호출자의 대기 시간이 큐 마감보다 짧아 먼저 포기한다.
+        for i in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(scheduler.submit(llm.request(i), timeout=0.2), 0.05)
+
+        assert scheduler.queue_depth == 0
+        scheduler.check_capacity()
+        assert scheduler.rejected == 0
+
+        gate.set()
+        await blocker
+        assert llm.calls == ["blocker"]
+
+    asyncio.run(scenario())
+
+
+def test_rate_limited_calls_are_retried_with_backoff():
+    async def scenario():
+        scheduler = make_scheduler(max_retries=3, backoff_base=0.01, backoff_max=0.05)
+        llm = FakeLLM(failures=2)
+
+        assert await scheduler.submit(llm.request("answer")) == "answer"
+        assert scheduler.retried == 2
+        assert len(llm.started) == 3
+        assert scheduler.completed == 1
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_retries_exhausted_raise_overloaded():
+    async def scenario():
+        scheduler = make_scheduler(max_retries=2, backoff_base=0.01, backoff_max=0.05)
+        llm = FakeLLM(failures=10)
+
+        with pytest.raises(SchedulerOverloaded) as excinfo:
+            await scheduler.submit(llm.request("answer"))
+        assert isinstance(excinfo.value.__cause__, RateLimitError)
+        assert len(llm.started) == 3
+        assert scheduler.failed == 1
+
+    asyncio.run(scenario())
+
+
+def test_other_errors_are_not_retried():
+    async def scenario():
+        scheduler = make_scheduler()
+
+        async def broken():
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            await scheduler.submit(broken)
+        assert scheduler.retried == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=1, max_queue_size=2, requests_per_minute=60)
+        gate = asyncio.Event()
+        llm = FakeLLM(gate=gate)
+
+        running = asyncio.ensure_future(scheduler.submit(llm.request("running")))
+        await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(scheduler.submit(llm.request(i))) for i in range(2)]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(SchedulerOverloaded) as excinfo:
+            await scheduler.submit(llm.request("rejected"))
+        # 대기 2건 + 실행 1건을 초당 1건으로 처리하는 데 약 3초
+        assert excinfo.value.retry_after == 3
+        assert scheduler.rejected == 1
+        with pytest.raises(SchedulerOverloaded):
+            scheduler.check_capacity()
+
+        gate.set()
+        await asyncio.gather(running, *queued)
+        assert "rejected" not in llm.calls
+
+    asyncio.run(scenario())
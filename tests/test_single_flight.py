@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+class FakeUpstream:
+    # 호출 횟수를 세고, release가 설정될 때까지 응답을 붙잡아 두는 가짜 업스트림
+    def __init__(self, result="answer", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def start_waiters(flight, upstream, n, key="question"):
+    tasks = [asyncio.ensure_future(flight.do(key, upstream)) for _ in range(n)]
+    # 모든 요청이 공유 작업을 기다리기 시작할 때까지 진행시킨다.
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_concurrent_identical_requests_execute_once():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = FakeUpstream()
+        tasks = await start_waiters(flight, upstream, 100)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == ["answer"] * 100
+        assert upstream.calls == 1
+        assert flight.executions == 1
+        assert flight.coalesced == 99
+        assert flight.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_execute_separately():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = FakeUpstream()
+        tasks = [asyncio.ensure_future(flight.do(key, upstream)) for key in ("a", "b", "a")]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        await asyncio.gather(*tasks)
+
+        assert upstream.calls == 2
+        assert flight.executions == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = FakeUpstream()
+        tasks = await start_waiters(flight, upstream, 3)
+
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1:] == ["answer", "answer"]
+        assert upstream.calls == 1
+        assert not upstream.cancelled
+
+    asyncio.run(scenario())
+
+
+def test_all_waiters_cancelled_cancels_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = FakeUpstream()
+        tasks = await start_waiters(flight, upstream, 3)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert upstream.cancelled
+        assert flight.in_flight == 0
+        assert flight._calls == {}
+
+        # 같은 키로 다시 요청하면 새로 실행된다.
+        upstream.release.set()
+        assert await flight.do("question", upstream) == "answer"
+        assert upstream.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        upstream = FakeUpstream(error=RuntimeError("upstream failed"))
+        tasks = await start_waiters(flight, upstream, 5)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert upstream.calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.in_flight == 0
+
+        # 실패한 결과는 캐시되지 않는다.
+        with pytest.raises(RuntimeError):
+            await flight.do("question", upstream)
+        assert upstream.calls == 2
+
+    asyncio.run(scenario())
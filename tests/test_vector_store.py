@@ -0,0 +1,171 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_openai")
+
+from langchain.schema import Document
+
+from app.core.config import settings
+from app.services.vector_store import StaleCursorError, VectorStore
+
+
+class FakeEmbeddings:
+    # 본문 해시로 결정되는 임베딩 (네트워크 호출 없음)
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=16).tolist()
+
+
+def make_store(monkeypatch, snapshot_dir):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "INDEX_SNAPSHOT_DIR", snapshot_dir)
+    monkeypatch.setattr(settings, "INDEX_REFRESH_INTERVAL", 0.0)
+    store = VectorStore()
+    store.embedding_model = FakeEmbeddings()
+    return store
+
+
+@pytest.fixture(params=["snapshot", "memory"])
+def store(request, tmp_path, monkeypatch):
+    # 같은 동작을 스냅샷 모드와 인메모리(DocumentStore + Chroma) 모드 모두에서 확인한다.
+    return make_store(monkeypatch, str(tmp_path) if request.param == "snapshot" else None)
+
+
+@pytest.fixture
+def snapshot_store(tmp_path, monkeypatch):
+    return make_store(monkeypatch, str(tmp_path))
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    return make_store(monkeypatch, None)
+
+
+def contents(store, is_law_related=False):
+    return sorted((doc.metadata["source"], doc.page_content) for _, doc in store.iter_documents(is_law_related))
+
+
+def test_deleting_a_source_keeps_chunks_shared_with_other_sources(store):
+    shared = "제1조 이 규정은 항만 시설 사용에 적용한다."
+    store.add_documents([Document(page_content=shared, metadata={"source": "A.pdf"}), Document(page_content="A 전용", metadata={"source": "A.pdf"})])
+    store.add_documents([Document(page_content=shared, metadata={"source": "B.pdf"})])
+
+    assert store.delete_source("A.pdf") == 2
+    assert contents(store) == [("B.pdf", shared)]
+
+
+def test_same_chunk_within_a_source_is_stored_once(store):
+    docs = [Document(page_content="중복  문장", metadata={"source": "A.pdf"}), Document(page_content="중복 문장", metadata={"source": "A.pdf"})]
+    assert store.add_documents(docs) == 1
+    assert store.add_documents(docs) == 0
+
+
+def test_replacing_a_source_keeps_shared_chunks_of_other_sources(store):
+    shared = "공통 조항"
+    store.add_documents([Document(page_content=shared, metadata={"source": "A.pdf"})])
+    store.add_documents([Document(page_content=shared, metadata={"source": "B.pdf"})])
+
+    store.add_documents([Document(page_content="새 내용", metadata={"source": "A.pdf"})], replace_source="A.pdf")
+
+    assert contents(store) == [("A.pdf", "새 내용"), ("B.pdf", shared)]
+
+
+def test_list_documents_pages_through_all_rows(store):
+    store.add_documents([Document(page_content=f"청크 {i}", metadata={"source": "A.pdf", "page": i}) for i in range(5)])
+
+    seen = []
+    generation, start = None, 0
+    while True:
+        generation, rows, next_row = store.list_documents(False, start=start, limit=2, generation=generation)
+        seen.extend(doc.page_content for _, doc in rows)
+        if next_row is None:
+            break
+        start = next_row
+
+    assert seen == [f"청크 {i}" for i in range(5)]
+
+
+def test_list_documents_rejects_cursor_after_compaction(store):
+    store.add_documents([Document(page_content=f"A {i}", metadata={"source": "A.pdf"}) for i in range(3)])
+    store.add_documents([Document(page_content=f"B {i}", metadata={"source": "B.pdf"}) for i in range(3)])
+    generation, _, next_row = store.list_documents(False, limit=2)
+
+    store.delete_source("A.pdf")
+    # 삭제만으로는 행 번호가 바뀌지 않으므로 커서가 그대로 유효하다.
+    assert store.list_documents(False, start=next_row, limit=2, generation=generation)[0] == generation
+
+    store.compact_if_needed(min_ratio=0.1)
+    with pytest.raises(StaleCursorError):
+        store.list_documents(False, start=next_row, limit=2, generation=generation)
+
+
+def test_document_batches_are_published_as_one_version(snapshot_store):
+    store = snapshot_store
+    store.add_documents([Document(page_content="이전 내용", metadata={"source": "A.hwp"})])
+    version = store.index_version
+    batches = ([Document(page_content=f"새 내용 {i}-{j}", metadata={"source": "A.hwp"}) for j in range(3)] for i in range(4))
+
+    assert store.add_document_batches(batches, replace_source="A.hwp") == 12
+    assert int(store.index_version[1:]) == int(version[1:]) + 1
+    assert len(contents(store)) == 12
+    assert ("A.hwp", "이전 내용") not in contents(store)
+
+
+def test_failed_document_batches_leave_the_index_unchanged(snapshot_store):
+    store = snapshot_store
+    store.add_documents([Document(page_content="이전 내용", metadata={"source": "A.hwp"})])
+    version = store.index_version
+
+    def batches():
+        yield [Document(page_content="새 내용", metadata={"source": "A.hwp"})]
+        raise ValueError("corrupt file")
+
+    with pytest.raises(ValueError):
+        store.add_document_batches(batches(), replace_source="A.hwp")
+    assert store.index_version == version
+    assert contents(store) == [("A.hwp", "이전 내용")]
+
+
+def test_stats_report_live_text_bytes_only(store):
+    store.add_documents([Document(page_content=f"이전 {i}", metadata={"source": "A.pdf"}) for i in range(3)])
+    store.add_documents([Document(page_content="유지", metadata={"source": "B.pdf"})])
+    store.add_documents([Document(page_content="새 내용", metadata={"source": "A.pdf"})], replace_source="A.pdf")
+
+    stats = store.stats()
+    live = [content for _, content in contents(store)]
+    assert stats["documents"] == len(live) == 2
+    assert stats["bytes"] == sum(len(content.encode("utf-8")) for content in live)
+    assert stats["partitions"]["general"]["tombstones"] == 3
+
+
+def test_memory_document_batches_replace_on_the_first_batch(memory_store):
+    memory_store.add_documents([Document(page_content="이전 내용", metadata={"source": "A.hwp"})])
+    batches = ([Document(page_content=f"새 내용 {i}-{j}", metadata={"source": "A.hwp"}) for j in range(3)] for i in range(2))
+
+    assert memory_store.add_document_batches(batches, replace_source="A.hwp") == 6
+    assert len(contents(memory_store)) == 6
+    assert memory_store.general_documents.tombstones == 1
+
+
+def test_memory_search_and_delete_follow_chroma(memory_store):
+    docs = [Document(page_content=f"항만 안내 {i}", metadata={"source": "A.pdf", "page": i}) for i in range(3)]
+    memory_store.add_documents(docs)
+    memory_store.add_documents([Document(page_content="법률 조항", metadata={"source": "law.pdf"})], is_law_related=True)
+    query = FakeEmbeddings().embed_query("항만 안내 1")
+
+    assert memory_store.search("항만 안내 1", k=1, query_vector=query)[0].page_content == "항만 안내 1"
+    assert memory_store.search("법률 조항", is_law_related=True, k=4)[0].metadata["source"] == "law.pdf"
+
+    version = memory_store.index_version
+    assert memory_store.delete_source("A.pdf") == 3
+    assert memory_store.index_version > version
+    assert memory_store.search("항만 안내 1", k=4, query_vector=query) == []
+    # 삭제된 청크의 해시가 빠졌으므로 같은 문서를 다시 올릴 수 있다.
+    assert memory_store.add_documents(docs) == 3